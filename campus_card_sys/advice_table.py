@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预生成AI建议表
+招领点建议只取决于建筑物和它最近的招领点，而地点数据库中的建筑物和招领点都是固定的，
+因此启动时在后台为每个(建筑物, 最近招领点)组合生成一次建议并保存到precomputed_advice表，
+全部条目同时加载到内存，查询时直接查表返回，不再实时调用DeepSeek
+
+条目按location_database.json的哈希区分：地图修改后重启服务，旧条目被清理，
+新地图下的组合在后台重新生成，生成完成前的请求仍由实时调用兜底
+"""
+
+import time
+import threading
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from models import db, PrecomputedAdvice
+from db_config import write_transaction, ensure_app_context
+
+
+class AdviceTable:
+    """预生成建议的内存查找表 + 后台生成任务"""
+
+    def __init__(self, app, generator, map_hash, pause=0.5):
+        self.app = app
+        # generator(location_name, nearest_point)，返回建议文本，失败返回None
+        self.generator = generator
+        self.map_hash = map_hash
+        self.pause = pause  # 两次生成之间的间隔（秒），避免后台任务占满API频率
+
+        self._lock = threading.Lock()
+        self._advice = {}  # (建筑物名称, 招领点名称) -> 建议
+        self._thread = None
+
+        self._hits = 0
+        self._misses = 0
+        self._generated = 0
+        self._failed = 0
+
+    def get(self, location_name, lost_and_found):
+        """查找预生成的建议，没有时返回None"""
+        with self._lock:
+            advice = self._advice.get((location_name, lost_and_found))
+            if advice is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return advice
+
+    def __len__(self):
+        with self._lock:
+            return len(self._advice)
+
+    def load(self):
+        """
+        清理旧地图的条目并加载当前地图的全部条目
+
+        Returns:
+            tuple: (加载的条目数, 清理的旧条目数)
+        """
+        with ensure_app_context(self.app):
+            with write_transaction():
+                stale_count = PrecomputedAdvice.query.filter(
+                    PrecomputedAdvice.map_hash != self.map_hash
+                ).delete(synchronize_session=False)
+
+            rows = db.session.query(
+                PrecomputedAdvice.location_name,
+                PrecomputedAdvice.lost_and_found,
+                PrecomputedAdvice.advice
+            ).filter(PrecomputedAdvice.map_hash == self.map_hash).all()
+
+        with self._lock:
+            self._advice = {(row.location_name, row.lost_and_found): row.advice for row in rows}
+        return len(rows), stale_count
+
+    def add(self, location_name, lost_and_found, advice):
+        """保存一条建议（已存在时保留原条目）"""
+        with self._lock:
+            if (location_name, lost_and_found) in self._advice:
+                return
+            self._advice[(location_name, lost_and_found)] = advice
+
+        with ensure_app_context(self.app):
+            try:
+                with write_transaction():
+                    db.session.add(PrecomputedAdvice(
+                        location_name=location_name,
+                        lost_and_found=lost_and_found,
+                        map_hash=self.map_hash,
+                        advice=advice,
+                        created_at=datetime.now()
+                    ))
+            except IntegrityError:
+                # 其他进程已写入同一组合
+                pass
+
+    def missing_pairs(self, nearest_points):
+        """
+        还没有建议的组合
+
+        Args:
+            nearest_points (dict): 建筑物名称 -> 最近招领点信息
+        """
+        with self._lock:
+            return [
+                (location_name, point) for location_name, point in nearest_points.items()
+                if (location_name, point['name']) not in self._advice
+            ]
+
+    def generate_missing(self, nearest_points, is_available=None):
+        """
+        为缺少建议的组合逐个生成建议
+
+        Args:
+            nearest_points (dict): 建筑物名称 -> 最近招领点信息
+            is_available: 返回AI是否可用的函数，不可用时停止，下次启动再继续
+
+        Returns:
+            int: 本次生成的条目数
+        """
+        pairs = self.missing_pairs(nearest_points)
+        if not pairs:
+            return 0
+
+        print(f"开始预生成AI建议: {len(pairs)}个组合")
+        generated = 0
+        for location_name, point in pairs:
+            if is_available is not None and not is_available():
+                print(f"AI暂不可用，停止预生成建议（已完成{generated}/{len(pairs)}）")
+                break
+
+            advice = self.generator(location_name, point)
+            if advice:
+                self.add(location_name, point['name'], advice)
+                generated += 1
+                with self._lock:
+                    self._generated += 1
+            else:
+                with self._lock:
+                    self._failed += 1
+
+            if self.pause:
+                time.sleep(self.pause)
+
+        print(f"AI建议预生成结束: 新增{generated}条，共{len(self)}条")
+        return generated
+
+    def start_generation(self, nearest_points, is_available=None):
+        """在后台线程中生成缺少的建议（已有任务在运行时不重复启动）"""
+        if not self.missing_pairs(nearest_points):
+            return False
+        if self._thread is not None and self._thread.is_alive():
+            return False
+
+        self._thread = threading.Thread(
+            target=self._run_generation,
+            args=(nearest_points, is_available),
+            name='advice-generation',
+            daemon=True  # 已生成的条目已持久化，进程退出时下次启动继续生成
+        )
+        self._thread.start()
+        return True
+
+    def _run_generation(self, nearest_points, is_available):
+        try:
+            self.generate_missing(nearest_points, is_available)
+        except Exception as e:
+            print(f"预生成AI建议失败: {e}")
+
+    def get_stats(self):
+        """获取查找表统计信息"""
+        with self._lock:
+            return {
+                'entries': len(self._advice),
+                'map_hash': self.map_hash,
+                'hits': self._hits,
+                'misses': self._misses,
+                'generated': self._generated,
+                'failed': self._failed,
+                'generating': self._thread is not None and self._thread.is_alive()
+            }
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台地点分析任务队列
+任务先写入location_analysis_job表再交给固定数量的工作线程执行，
+工作线程每次取出一批任务一起处理（便于批量调用DeepSeek），
+失败的任务按指数退避延迟后重新放入队列，服务重启后未完成的任务会被重新加载
+"""
+
+import time
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from models import db, LocationAnalysisJob
+from db_config import write_transaction, ensure_app_context
+
+
+class AnalysisJobQueue:
+    """持久化任务队列 + 固定大小的工作线程池"""
+
+    def __init__(self, app, handler, max_workers=2, max_attempts=3, batch_size=10, batch_wait=0.5,
+                 retry_backoff=30, retry_backoff_max=300):
+        self.app = app
+        # handler([(card_id, found_location), ...])，返回与输入等长的列表，
+        # 每一项为None（成功）或该任务的失败原因；整体失败时直接抛出异常
+        self.handler = handler
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size  # 每批最多处理的任务数
+        self.batch_wait = batch_wait  # 凑批时最多等待的秒数
+        # 第n次失败后等待retry_backoff * 2^(n-1)秒再重试（不超过retry_backoff_max），
+        # 避免上游故障期间任务在几秒内用完全部重试次数
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+
+        self._queue = queue.Queue()
+        self._workers = []
+        self._workers_lock = threading.Lock()
+
+        # 最近完成任务的耗时（秒）：(排队+执行总耗时, 执行耗时)
+        self._latencies = deque(maxlen=200)
+        self._stats_lock = threading.Lock()
+        self._delayed = 0  # 等待退避结束、尚未放回队列的任务数
+
+    def start(self):
+        """启动工作线程（重复调用无副作用）"""
+        with self._workers_lock:
+            while len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"location-analysis-{len(self._workers) + 1}",
+                    daemon=True  # 任务已持久化，进程退出时未完成的任务会在下次启动时重放
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def replay_pending(self):
+        """重新加载上次退出时未完成的任务"""
+        with self.app.app_context():
+            # 上次运行中被中断的任务重新置为待执行
+            with write_transaction():
+                LocationAnalysisJob.query.filter_by(status='running').update(
+                    {'status': 'pending'}, synchronize_session=False
+                )
+
+            job_ids = [job.id for job in LocationAnalysisJob.query.filter_by(
+                status='pending'
+            ).order_by(LocationAnalysisJob.id).all()]
+
+        for job_id in job_ids:
+            self._queue.put(job_id)
+
+        if job_ids:
+            print(f"已重新加载{len(job_ids)}个未完成的地点分析任务")
+        return len(job_ids)
+
+    def create_job(self, card_id, found_location):
+        """
+        在调用方的会话中创建任务记录（不提交，需在调用方的write_transaction中调用）
+
+        事务提交后再调用submit(job.id)，任务与业务数据一起提交，
+        不单独占用一个连接
+        """
+        job = LocationAnalysisJob(
+            card_id=card_id,
+            found_location=found_location,
+            status='pending',
+            attempts=0,
+            created_at=datetime.now()
+        )
+        db.session.add(job)
+        return job
+
+    def submit(self, job_id):
+        """把已提交到数据库的任务放入内存队列"""
+        self.start()
+        self._queue.put(job_id)
+
+    def retry_delay(self, attempts):
+        """第attempts次执行失败后的重试等待秒数"""
+        return min(self.retry_backoff * 2 ** max(attempts - 1, 0), self.retry_backoff_max)
+
+    def _schedule_retry(self, job_ids, delay):
+        """退避delay秒后把任务重新放入队列（任务已在数据库中置为pending，进程退出时由重放接管）"""
+        if delay <= 0:
+            for job_id in job_ids:
+                self._queue.put(job_id)
+            return
+
+        with self._stats_lock:
+            self._delayed += len(job_ids)
+        timer = threading.Timer(delay, self._requeue, args=(job_ids,))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, job_ids):
+        with self._stats_lock:
+            self._delayed -= len(job_ids)
+        for job_id in job_ids:
+            self._queue.put(job_id)
+
+    def _next_batch(self):
+        """阻塞等待第一个任务，然后在batch_wait内尽量凑满一批"""
+        job_ids = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(job_ids) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job_ids.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return job_ids
+
+    def _worker_loop(self):
+        while True:
+            job_ids = self._next_batch()
+            try:
+                self._run_jobs(job_ids)
+            except Exception as e:
+                print(f"地点分析任务执行异常: 任务ID={job_ids}, 错误={e}")
+            finally:
+                for _ in job_ids:
+                    self._queue.task_done()
+
+    def claim(self, job_ids, started_at):
+        """
+        领取任务：逐个执行带条件的UPDATE，只有仍为pending的任务会被置为running
+
+        同一个任务ID可能被重复放入内存队列（重放与重试），
+        条件更新保证每次执行只被一个工作线程领取
+
+        Returns:
+            list: 本次成功领取的任务ID
+        """
+        claimed = []
+        with write_transaction():
+            for job_id in job_ids:
+                result = db.session.execute(
+                    db.update(LocationAnalysisJob).where(
+                        LocationAnalysisJob.id == job_id,
+                        LocationAnalysisJob.status == 'pending'
+                    ).values(
+                        status='running',
+                        attempts=db.func.coalesce(LocationAnalysisJob.attempts, 0) + 1,
+                        started_at=started_at
+                    ).execution_options(synchronize_session=False)
+                )
+                if result.rowcount:
+                    claimed.append(job_id)
+        return claimed
+
+    def _run_jobs(self, job_ids):
+        with self.app.app_context():
+            started_at = datetime.now()
+            claimed = self.claim(list(dict.fromkeys(job_ids)), started_at)
+            if not claimed:
+                return
+
+            jobs = LocationAnalysisJob.query.filter(
+                LocationAnalysisJob.id.in_(claimed)
+            ).order_by(LocationAnalysisJob.id).all()
+            # 取出任务参数后结束读事务，执行期间不在本会话中占用连接
+            items = [(job.card_id, job.found_location) for job in jobs]
+            db.session.commit()
+
+            try:
+                errors = self.handler(items)
+            except Exception as e:
+                errors = [e] * len(jobs)
+
+            finished_at = datetime.now()
+            retries = {}  # 重试等待秒数 -> 任务ID
+            latencies = []
+            # 读取过期属性会触发自动flush，整个更新过程都在写锁内进行
+            with write_transaction():
+                for job, error in zip(jobs, errors):
+                    if error is None:
+                        job.status = 'done'
+                        job.finished_at = finished_at
+                        latencies.append((
+                            (finished_at - job.created_at).total_seconds(),
+                            (finished_at - job.started_at).total_seconds()
+                        ))
+                        continue
+
+                    job.last_error = str(error)[:500]
+                    if job.attempts < self.max_attempts:
+                        job.status = 'pending'
+                        delay = self.retry_delay(job.attempts)
+                        retries.setdefault(delay, []).append(job.id)
+                        print(f"地点分析任务失败，{delay}秒后重试: 任务ID={job.id}, 第{job.attempts}次, 错误={error}")
+                    else:
+                        job.status = 'failed'
+                        job.finished_at = finished_at
+                        print(f"地点分析任务最终失败: 任务ID={job.id}, 错误={error}")
+
+        for delay, retry_ids in retries.items():
+            self._schedule_retry(retry_ids, delay)
+
+        with self._stats_lock:
+            self._latencies.extend(latencies)
+
+    def get_stats(self):
+        """获取队列深度、各状态任务数和最近任务耗时"""
+        with ensure_app_context(self.app):
+            rows = db.session.query(
+                LocationAnalysisJob.status,
+                db.func.count(LocationAnalysisJob.id)
+            ).group_by(LocationAnalysisJob.status).all()
+        status_counts = {status: count for status, count in rows}
+
+        with self._stats_lock:
+            latencies = list(self._latencies)
+            delayed = self._delayed
+
+        def summarize(values):
+            if not values:
+                return {'avg': None, 'p95': None, 'max': None}
+            values = sorted(values)
+            return {
+                'avg': round(sum(values) / len(values), 3),
+                'p95': round(values[min(int(len(values) * 0.95), len(values) - 1)], 3),
+                'max': round(values[-1], 3)
+            }
+
+        with self._workers_lock:
+            alive_workers = sum(1 for worker in self._workers if worker.is_alive())
+
+        return {
+            'queue_depth': self._queue.qsize(),
+            'delayed_retries': delayed,
+            'workers': alive_workers,
+            'max_workers': self.max_workers,
+            'max_attempts': self.max_attempts,
+            'retry_backoff': self.retry_backoff,
+            'batch_size': self.batch_size,
+            'jobs_by_status': status_counts,
+            'recent_completed': len(latencies),
+            'total_latency_seconds': summarize([total for total, _ in latencies]),
+            'run_latency_seconds': summarize([run for _, run in latencies])
+        }
@@ -1,29 +1,34 @@
 # app.py
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from models import db, User, CampusCard, ForumPost, Reward
+from models import db, User, CampusCard, ForumPost, Reward, LocationCacheEntry, LocationAnalysisJob
+from deepseek_client import DeepSeekClient, CircuitBreaker
+from location_cache import LRUTTLCache, SingleFlight, HedgedExecutor, BackgroundRefresher
+from analysis_queue import AnalysisJobQueue
+from location_matcher import LocationMatcher
+from location_index import LocationIndex
+from advice_table import AdviceTable
+import hot_location_counter
+import points_ledger
+from reward_catalog import REWARD_CATALOG
+from image_upload import process_upload, ImageUploadError
+from schema_migration import upgrade_schema
+from db_config import WRITE_SERIALIZER, write_transaction, ensure_app_context, get_database_uri, get_engine_options
 from datetime import datetime, timedelta
 import re
 import os
-import uuid
 import json
-import requests
-import threading
 import time
 import hashlib
-from werkzeug.utils import secure_filename
 
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///campus_card.db'
+# 数据库地址和连接池参数由环境变量配置（见db_config.py），默认使用SQLite
+app.config['SQLALCHEMY_DATABASE_URI'] = get_database_uri()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # 添加Flask配置以提高稳定性
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_pre_ping': True,
-    'pool_recycle': 300,
-    'connect_args': {'timeout': 20}
-}
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options()
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 31536000  # 1年
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600     # 1小时
 
@@ -49,7 +54,17 @@ NETWORK_CONFIG = {
     'read_timeout': 90,     # 读取超时
     'max_retries': 3,       # 最大重试次数
     'backoff_factor': 1,    # 退避因子
-    'verify_ssl': True      # SSL验证
+    'backoff_max': 4,       # 单次退避最长等待（秒）
+    'deadline': 20,         # 单次AI调用（含重试）的总时间预算（秒）
+    'location_deadline': 8, # 地点识别的时间预算，超时走关键词匹配
+    'batch_deadline': 30,   # 批量地点识别（后台任务）的时间预算
+    'stream_idle_timeout': 15,   # 流式AI建议等待首个片段和两个片段之间的最长秒数
+    'stream_max_duration': 120,  # 流式AI建议的最长总时长，超过后回复标记为不完整
+    'breaker_failure_threshold': 3,  # 连续失败多少次后熔断
+    'breaker_recovery_timeout': 30,  # 熔断多少秒后放行探测请求
+    'verify_ssl': True,     # SSL验证
+    'pool_maxsize': 10,     # 连接池大小（与waitress线程数一致）
+    'keep_alive': True      # 启用TCP keep-alive
 }
 
 # 加载地点数据库
@@ -62,48 +77,229 @@ def load_location_database():
         print(f"加载地点数据库失败: {e}")
         return {}
 
+def get_location_database_hash():
+    """计算地点数据库文件的哈希，地图修改后持久化缓存自动失效"""
+    try:
+        with open('location_database.json', 'rb') as f:
+            return hashlib.md5(f.read()).hexdigest()
+    except Exception as e:
+        print(f"计算地点数据库哈希失败: {e}")
+        return ''
+
 LOCATION_DB = load_location_database()
+LOCATION_DB_HASH = get_location_database_hash()
+
+# 用户常用的泛称 -> 对应地点的名称片段，用于挑选发送给DeepSeek的候选地点
+LOCATION_CATEGORY_KEYWORDS = {
+    '食堂': ('梧桐苑', '康桥苑'),
+    '餐厅': ('梧桐苑', '康桥苑'),
+    '饭堂': ('梧桐苑', '康桥苑'),
+    '操场': ('足球场', '体育中心'),
+    '运动场': ('足球场', '体育中心'),
+    '体育馆': ('体育中心', '文体中心'),
+    '健身房': ('体育中心', '文体中心'),
+    '宿舍': ('舍', '书院'),
+    '寝室': ('舍', '书院'),
+    '教学楼': ('教一楼', '教二楼', '主A', '主B', '主C', '主D', '主E', '中一楼', '中二楼', '中三楼',
+              '东1楼', '东2楼', '东3楼', '西一楼', '西二楼'),
+    '教室': ('教一楼', '教二楼', '主A', '主B', '主C', '主D', '主E', '中一楼', '中二楼', '中三楼',
+             '东1楼', '东2楼', '东3楼', '西一楼', '西二楼'),
+    '小卖部': ('超市',),
+    '医务室': ('校医院',),
+    '澡堂': ('浴室',),
+    '校门': ('门',),
+}
+
+# 预编译的地点匹配器（关键词匹配只需扫描一遍输入）
+LOCATION_MATCHER = LocationMatcher(LOCATION_DB, category_keywords=LOCATION_CATEGORY_KEYWORDS)
+
+# 全部地点名称（去重，保持数据库顺序），本地召回不足时整体发送给DeepSeek
+ALL_LOCATION_NAMES = list(dict.fromkeys(loc_data['name'] for loc_data in LOCATION_DB.values()))
+
+# 地点识别提示词的候选裁剪：只把本地打分最高的若干地点发送给DeepSeek，
+# 提示词长度不再随地图规模线性增长
+PROMPT_CANDIDATE_CONFIG = {
+    'top_k': 15,          # 每条输入最多发送的候选地点数
+    'min_top_score': 0.5  # 最高分低于该值（没有二字组合、泛称或拼音命中，只有零散的单字重合）时发送全部地点
+}
+
+def select_prompt_candidates(user_inputs):
+    """
+    挑选发送给DeepSeek的候选地点
+
+    Args:
+        user_inputs (list): 用户输入的文本列表（批量识别时为多条）
+
+    Returns:
+        tuple: (候选地点名称列表, 是否经过裁剪)；任一输入本地召回不足时返回全部地点
+    """
+    candidates = {}
+    for user_input in user_inputs:
+        ranked = LOCATION_MATCHER.rank(user_input, top_k=PROMPT_CANDIDATE_CONFIG['top_k'])
+        if not ranked or ranked[0][1] < PROMPT_CANDIDATE_CONFIG['min_top_score']:
+            return ALL_LOCATION_NAMES, False
+        for location_name, _ in ranked:
+            candidates.setdefault(location_name, None)
+
+    if len(candidates) >= len(ALL_LOCATION_NAMES):
+        return ALL_LOCATION_NAMES, False
+    return list(candidates), True
+
+# 地点索引：名称/类型索引、空间索引和预计算的最近招领点
+LOCATION_INDEX = LocationIndex(LOCATION_DB)
 
 # ==================== 缓存系统 ====================
 
-# 查询结果缓存
-QUERY_CACHE = {}
+# 查询结果缓存（线程安全，LRU淘汰 + TTL过期）
 CACHE_EXPIRY_TIME = 7200  # 缓存2小时，增加稳定性
+CACHE_STALE_TIME = 86400  # 过期后24小时内仍先返回旧结果，同时在后台重新识别
+CACHE_MAX_ENTRIES = 2000  # 最多缓存的查询条数
+CACHE_MAX_REFRESHES = 2   # 同时进行的后台刷新数上限
+QUERY_CACHE = LRUTTLCache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_EXPIRY_TIME, stale_ttl=CACHE_STALE_TIME)
+LOCATION_CACHE_REFRESHER = BackgroundRefresher(max_concurrent=CACHE_MAX_REFRESHES, thread_name_prefix='location-refresh')
+
+# 合并并发的相同地点识别请求，避免同一文本同时触发多次DeepSeek调用
+LOCATION_SINGLE_FLIGHT = SingleFlight()
+
+# 各接口等待AI地点识别的时间预算（秒）：超时先返回关键词匹配结果，
+# AI识别在后台继续执行并写入缓存，下次相同的查询直接得到AI结果；未配置的接口一直等待AI结果
+LOCATION_LATENCY_BUDGETS = {
+    'smart_location_query': 1.5,
+}
+# 执行带时间预算的地点识别的后台线程
+LOCATION_HEDGED_EXECUTOR = HedgedExecutor(max_workers=4, thread_name_prefix='location-resolve')
 
 def get_cache_key(user_input, return_best_match=False):
     """生成缓存键"""
     cache_data = f"{user_input.lower().strip()}_{return_best_match}"
     return hashlib.md5(cache_data.encode('utf-8')).hexdigest()
 
-def get_from_cache(cache_key):
-    """从缓存获取结果"""
-    if cache_key in QUERY_CACHE:
-        cached_data = QUERY_CACHE[cache_key]
-        # 检查是否过期
-        if time.time() - cached_data['timestamp'] < CACHE_EXPIRY_TIME:
-            return cached_data['result']
-        else:
-            # 删除过期缓存
-            del QUERY_CACHE[cache_key]
-    return None
+def get_from_cache(cache_key, user_input=None, return_best_match=False):
+    """
+    从缓存获取结果（超过硬过期时间的条目在读取时惰性删除）
+
+    条目已超过软过期时间时仍返回旧结果，并在后台重新识别（需提供user_input）
+    """
+    result, stale = QUERY_CACHE.get_entry(cache_key)
+    if result is not None and stale and user_input is not None:
+        refresh_location_in_background(user_input, return_best_match, cache_key)
+    return result
+
+def refresh_location_in_background(user_input, return_best_match, cache_key):
+    """在后台重新识别已过期的缓存条目（识别完成后覆盖缓存，失败时保留旧结果）"""
+    # 同一条目同时只刷新一次；刷新失败时返回None，因此不与正常的缓存未命中请求合并
+    started = LOCATION_CACHE_REFRESHER.submit(
+        cache_key,
+        lambda: resolve_location_uncached(user_input, return_best_match, cache_key, refresh=True)
+    )
+    if started:
+        print(f"缓存已过期，后台重新识别: {user_input}")
 
 def save_to_cache(cache_key, result):
     """保存结果到缓存"""
-    QUERY_CACHE[cache_key] = {
-        'result': result,
-        'timestamp': time.time()
-    }
+    QUERY_CACHE.set(cache_key, result)
 
 def clear_expired_cache():
     """清理过期缓存"""
-    current_time = time.time()
-    expired_keys = []
-    for key, data in QUERY_CACHE.items():
-        if current_time - data['timestamp'] >= CACHE_EXPIRY_TIME:
-            expired_keys.append(key)
+    QUERY_CACHE.purge_expired()
 
-    for key in expired_keys:
-        del QUERY_CACHE[key]
+# 热门地点统计结果缓存：公示页面会轮询该接口，短时间内直接返回缓存结果，
+# 报告新卡片或后台分析写入select_loc后立即失效
+HOT_LOCATIONS_CACHE_TTL = 60  # 秒
+HOT_LOCATIONS_WINDOWS = (7, 15, 30)  # 支持的统计窗口（天）
+HOT_LOCATIONS_DEFAULT_WINDOW = 15
+HOT_LOCATIONS_CACHE = LRUTTLCache(max_entries=len(HOT_LOCATIONS_WINDOWS), ttl=HOT_LOCATIONS_CACHE_TTL)
+
+def invalidate_hot_locations_cache():
+    """使热门地点统计缓存失效"""
+    HOT_LOCATIONS_CACHE.clear()
+
+# 持久化缓存：AI识别结果同时写入数据库，重启后无需再次调用DeepSeek
+PERSISTENT_CACHE_ENABLED = True
+
+def get_from_persistent_cache(cache_key):
+    """从持久化缓存获取结果（只读取与当前地点数据库哈希一致的条目）"""
+    if not PERSISTENT_CACHE_ENABLED:
+        return None
+    try:
+        with ensure_app_context(app):
+            entry = LocationCacheEntry.query.filter_by(
+                cache_key=cache_key,
+                map_hash=LOCATION_DB_HASH
+            ).first()
+            if entry:
+                return json.loads(entry.result)
+    except Exception as e:
+        print(f"读取持久化缓存失败: {e}")
+    return None
+
+def save_to_persistent_cache(cache_key, user_input, result):
+    """保存AI识别结果到持久化缓存"""
+    if not PERSISTENT_CACHE_ENABLED:
+        return
+    try:
+        with ensure_app_context(app), write_transaction():
+            entry = LocationCacheEntry.query.filter_by(
+                cache_key=cache_key,
+                map_hash=LOCATION_DB_HASH
+            ).first()
+            if entry:
+                entry.result = json.dumps(result, ensure_ascii=False)
+                entry.created_at = datetime.now()
+            else:
+                db.session.add(LocationCacheEntry(
+                    cache_key=cache_key,
+                    map_hash=LOCATION_DB_HASH,
+                    user_input=user_input[:200],
+                    result=json.dumps(result, ensure_ascii=False),
+                    created_at=datetime.now()
+                ))
+    except Exception as e:
+        print(f"写入持久化缓存失败: {e}")
+
+def warm_location_cache():
+    """启动时从持久化缓存预热内存缓存，并清理地图修改前的旧条目"""
+    if not PERSISTENT_CACHE_ENABLED:
+        return
+    try:
+        with app.app_context():
+            with write_transaction():
+                stale_count = LocationCacheEntry.query.filter(
+                    LocationCacheEntry.map_hash != LOCATION_DB_HASH
+                ).delete(synchronize_session=False)
+
+            entries = LocationCacheEntry.query.filter_by(
+                map_hash=LOCATION_DB_HASH
+            ).order_by(LocationCacheEntry.created_at.desc()).limit(CACHE_MAX_ENTRIES).all()
+
+            # 按时间从旧到新写入，使最新的条目在LRU中最后被淘汰
+            for entry in reversed(entries):
+                QUERY_CACHE.set(entry.cache_key, json.loads(entry.result))
+
+            print(f"地点缓存预热完成: 加载{len(entries)}条，清理过期地图条目{stale_count}条")
+    except Exception as e:
+        print(f"地点缓存预热失败: {e}")
+
+def initialize_services():
+    """服务启动时的初始化工作（需在数据库表创建之后调用）"""
+    warm_location_cache()
+    initialize_advice_table()
+
+    # 首次升级时根据已有校园卡回填热门地点计数
+    try:
+        with app.app_context():
+            rebuilt = hot_location_counter.ensure_counters()
+        if rebuilt:
+            print(f"已回填热门地点计数: {rebuilt}个计数桶")
+    except Exception as e:
+        print(f"回填热门地点计数失败: {e}")
+
+    # 启动后台分析工作线程，并重放上次未完成的任务
+    LOCATION_ANALYSIS_QUEUE.start()
+    try:
+        LOCATION_ANALYSIS_QUEUE.replay_pending()
+    except Exception as e:
+        print(f"重新加载地点分析任务失败: {e}")
 
 db.init_app(app)
 
@@ -111,59 +307,38 @@ db.init_app(app)
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,If-None-Match,If-Modified-Since')
+    response.headers.add('Access-Control-Expose-Headers', 'ETag,Last-Modified')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     return response
 
-def create_compatible_retry_strategy(total=3, backoff_factor=1, status_forcelist=None):
-    """创建兼容不同urllib3版本的重试策略"""
-    from urllib3.util.retry import Retry
-
-    if status_forcelist is None:
-        status_forcelist = [429, 500, 502, 503, 504]
-
-    methods = ["HEAD", "GET", "OPTIONS", "POST"]
-
-    try:
-        # 尝试使用新版本的参数名
-        return Retry(
-            total=total,
-            status_forcelist=status_forcelist,
-            allowed_methods=methods,
-            backoff_factor=backoff_factor
-        )
-    except TypeError:
-        # 使用旧版本的参数名
-        try:
-            return Retry(
-                total=total,
-                status_forcelist=status_forcelist,
-                method_whitelist=methods,
-                backoff_factor=backoff_factor
-            )
-        except TypeError:
-            # 最基本的重试策略
-            return Retry(
-                total=total,
-                status_forcelist=status_forcelist,
-                backoff_factor=backoff_factor
-            )
-
-def call_deepseek_api(prompt, system_message=None, max_retries=3):
-    """调用DeepSeek API - 增强版本，包含重试机制和更好的错误处理"""
-    headers = {
-        'Authorization': f'Bearer {DEEPSEEK_API_KEY}',
-        'Content-Type': 'application/json',
-        'User-Agent': 'CampusCardSystem/1.0',
-        'Accept': 'application/json',
-        'Connection': 'keep-alive'
-    }
+# 进程内共享的DeepSeek客户端，所有AI调用复用同一个连接池
+deepseek_client = DeepSeekClient(
+    DEEPSEEK_API_KEY,
+    DEEPSEEK_API_URL,
+    connect_timeout=NETWORK_CONFIG['connect_timeout'],
+    read_timeout=NETWORK_CONFIG['read_timeout'],
+    verify_ssl=NETWORK_CONFIG['verify_ssl'],
+    pool_maxsize=NETWORK_CONFIG['pool_maxsize'],
+    keep_alive=NETWORK_CONFIG['keep_alive'],
+    deadline=NETWORK_CONFIG['deadline'],
+    backoff_factor=NETWORK_CONFIG['backoff_factor'],
+    backoff_max=NETWORK_CONFIG['backoff_max'],
+    stream_idle_timeout=NETWORK_CONFIG['stream_idle_timeout'],
+    stream_max_duration=NETWORK_CONFIG['stream_max_duration'],
+    circuit_breaker=CircuitBreaker(
+        failure_threshold=NETWORK_CONFIG['breaker_failure_threshold'],
+        recovery_timeout=NETWORK_CONFIG['breaker_recovery_timeout']
+    )
+)
 
+def build_chat_payload(prompt, system_message=None, max_tokens=500, stream=False):
+    """构造DeepSeek聊天接口的请求体"""
     # 默认系统消息用于地点识别
     if system_message is None:
         system_message = "你是一个校园地点识别专家。请从用户输入的文本中识别出地点名称，并返回JSON格式的结果。"
 
-    data = {
+    return {
         "model": "deepseek-chat",
         "messages": [
             {
@@ -176,150 +351,79 @@ def call_deepseek_api(prompt, system_message=None, max_retries=3):
             }
         ],
         "temperature": 0.1,
-        "max_tokens": 500,
-        "stream": False
+        "max_tokens": max_tokens,
+        "stream": stream
     }
 
-    # 创建session以复用连接
-    session = requests.Session()
-    session.headers.update(headers)
-
-    # 配置适配器以提高连接稳定性
-    from requests.adapters import HTTPAdapter
-
-    # 使用兼容的重试策略
-    retry_strategy = create_compatible_retry_strategy(
-        total=max_retries,
-        backoff_factor=NETWORK_CONFIG['backoff_factor'],
-        status_forcelist=[429, 500, 502, 503, 504]
-    )
-
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-
-    # 设置代理（如果环境变量中有配置）
-    import os
-    proxies = {}
-    http_proxy = os.environ.get('HTTP_PROXY') or os.environ.get('http_proxy')
-    https_proxy = os.environ.get('HTTPS_PROXY') or os.environ.get('https_proxy')
-    if http_proxy:
-        proxies['http'] = http_proxy
-    if https_proxy:
-        proxies['https'] = https_proxy
-    if proxies:
-        session.proxies.update(proxies)
-        print(f"使用代理设置: {proxies}")
-
-    for attempt in range(1, max_retries + 1):
-        try:
-            print(f"DeepSeek API调用尝试 {attempt}/{max_retries}")
-
-            # 使用配置的超时时间：(连接超时, 读取超时)
-            timeout = (NETWORK_CONFIG['connect_timeout'], NETWORK_CONFIG['read_timeout'])
-            response = session.post(
-                DEEPSEEK_API_URL,
-                json=data,
-                timeout=timeout,
-                verify=NETWORK_CONFIG['verify_ssl']
-            )
-
-            print(f"API响应状态码: {response.status_code}")
-
-            if response.status_code == 200:
-                result = response.json()
-                content = result['choices'][0]['message']['content']
-                print(f"API调用成功，返回内容长度: {len(content)}")
-                return content
-            elif response.status_code == 401:
-                print(f"DeepSeek API认证失败: API密钥可能无效或已过期")
-                return None
-            elif response.status_code == 429:
-                print(f"DeepSeek API请求频率限制: {response.text}")
-                if attempt < max_retries:
-                    wait_time = 2 ** attempt  # 指数退避
-                    print(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                    continue
-                return None
-            elif response.status_code >= 500:
-                print(f"DeepSeek API服务器错误: {response.status_code}, {response.text}")
-                if attempt < max_retries:
-                    wait_time = 2 ** attempt
-                    print(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                    continue
-                return None
-            else:
-                print(f"DeepSeek API未知错误: {response.status_code}, {response.text}")
-                return None
-
-        except requests.exceptions.Timeout as e:
-            print(f"DeepSeek API超时错误 (尝试 {attempt}/{max_retries}): {e}")
-            if attempt < max_retries:
-                wait_time = 2 ** attempt
-                print(f"等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
-                continue
-            print("所有重试都超时，API调用失败")
-            return None
-
-        except requests.exceptions.ConnectionError as e:
-            print(f"DeepSeek API连接错误 (尝试 {attempt}/{max_retries}): {e}")
-            if attempt < max_retries:
-                wait_time = 2 ** attempt
-                print(f"等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
-                continue
-            print("所有重试都连接失败，API调用失败")
-            return None
-
-        except requests.exceptions.RequestException as e:
-            print(f"DeepSeek API请求异常 (尝试 {attempt}/{max_retries}): {e}")
-            if attempt < max_retries:
-                wait_time = 2 ** attempt
-                print(f"等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
-                continue
-            return None
-
-        except Exception as e:
-            print(f"DeepSeek API未知异常 (尝试 {attempt}/{max_retries}): {e}")
-            if attempt < max_retries:
-                wait_time = 2 ** attempt
-                print(f"等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
-                continue
-            return None
-
-    print("所有重试都失败，API调用最终失败")
-    return None
+def call_deepseek_api(prompt, system_message=None, max_retries=3, deadline=None, max_tokens=500, usage_tag='other'):
+    """调用DeepSeek API - 在时间预算内带抖动退避重试，预算用完立即返回None"""
+    data = build_chat_payload(prompt, system_message, max_tokens=max_tokens)
+    return deepseek_client.chat(data, max_retries=max_retries, deadline=deadline, usage_tag=usage_tag)
 
 # ==================== 模块A: 地点提取功能模块 ====================
 
-def extract_location_from_text(user_input, return_best_match=False):
+def extract_location_from_text(user_input, return_best_match=False, latency_budget=None):
     """
     模块A: 从用户输入文本中提取校园地点
 
     Args:
         user_input (str): 用户输入的文本
         return_best_match (bool): 是否只返回最佳匹配的单个地点
+        latency_budget (float): 等待识别结果的最长秒数，超时返回关键词匹配结果
+            （带refining标记），AI识别在后台继续并写入缓存；后台识别线程全部占用时
+            直接返回关键词匹配结果（不带refining标记）；None表示一直等待
 
     Returns:
         dict: 包含提取结果的字典
         - 如果 return_best_match=False: 返回所有找到的地点列表
         - 如果 return_best_match=True: 返回最佳匹配的单个地点
     """
-    # 清理过期缓存
-    clear_expired_cache()
-
     # 检查缓存
     cache_key = get_cache_key(user_input, return_best_match)
-    cached_result = get_from_cache(cache_key)
+    cached_result = get_from_cache(cache_key, user_input, return_best_match)
     if cached_result:
         print(f"缓存命中: {user_input} -> {cached_result}")
         return cached_result
 
+    # 缓存未命中：相同文本的并发请求只计算一次
+    def resolve():
+        return LOCATION_SINGLE_FLIGHT.do(
+            cache_key,
+            lambda: resolve_location_uncached(user_input, return_best_match, cache_key)
+        )
+
+    if not latency_budget:
+        return resolve()
+
+    completed, result = LOCATION_HEDGED_EXECUTOR.run(resolve, latency_budget)
+    if completed:
+        return result
+
+    local_result = dict(fallback_location_parsing(user_input, return_best_match))
+    if completed is None:
+        # 后台识别线程已全部占用：直接返回关键词匹配结果，不排队等待
+        print(f"AI地点识别繁忙，直接返回关键词匹配结果: {user_input} -> {local_result}")
+        return local_result
+
+    # 超出预算：先返回关键词匹配结果（不写入缓存，AI结果完成后写入）
+    local_result['refining'] = True
+    print(f"AI地点识别超出{latency_budget}秒预算，先返回关键词匹配结果: {user_input} -> {local_result}")
+    return local_result
+
+def resolve_location_uncached(user_input, return_best_match, cache_key, refresh=False):
+    """
+    缓存未命中时的地点识别：持久化缓存 → 关键词快速匹配 → DeepSeek → 关键词匹配兜底
+
+    refresh=True用于后台刷新过期条目：跳过持久化缓存，DeepSeek失败时不用关键词匹配结果
+    覆盖旧结果（返回None）
+    """
+    # 检查持久化缓存
+    persisted_result = None if refresh else get_from_persistent_cache(cache_key)
+    if persisted_result:
+        save_to_cache(cache_key, persisted_result)
+        print(f"持久化缓存命中: {user_input} -> {persisted_result}")
+        return persisted_result
+
     # 首先尝试快速关键词匹配
     fallback_result = fallback_location_parsing(user_input, return_best_match)
 
@@ -335,8 +439,13 @@ def extract_location_from_text(user_input, return_best_match=False):
             print(f"快速匹配: {user_input} -> {fallback_result}")
             return fallback_result
 
-    # 构建提示词，包含所有可能的地点名称
-    location_names = [loc_data['name'] for loc_data in LOCATION_DB.values()]
+    # DeepSeek熔断时直接使用关键词匹配结果（不写入缓存，恢复后仍可由AI分析）
+    if not deepseek_client.is_available():
+        print(f"DeepSeek熔断中，使用关键词匹配: {user_input} -> {fallback_result}")
+        return fallback_result
+
+    # 构建提示词，只包含本地打分选出的候选地点（召回不足时为全部地点）
+    location_names, pruned = select_prompt_candidates([user_input])
     location_list = "、".join(location_names)
 
     if return_best_match:
@@ -385,7 +494,11 @@ def extract_location_from_text(user_input, return_best_match=False):
 }}
 """
 
-    response = call_deepseek_api(prompt)
+    response = call_deepseek_api(
+        prompt,
+        deadline=NETWORK_CONFIG['location_deadline'],
+        usage_tag='location_pruned' if pruned else 'location_full'
+    )
     if response:
         try:
             # 尝试解析JSON响应
@@ -394,136 +507,222 @@ def extract_location_from_text(user_input, return_best_match=False):
                 result = json.loads(json_match.group())
                 # 保存到缓存
                 save_to_cache(cache_key, result)
+                save_to_persistent_cache(cache_key, user_input, result)
                 print(f"AI分析完成: {user_input} -> {result}")
                 return result
         except Exception as e:
             print(f"解析DeepSeek响应失败: {e}")
 
+    if refresh:
+        print(f"后台重新识别失败，保留旧结果: {user_input}")
+        return None
+
     # 如果API调用失败，使用简单的关键词匹配作为备选方案
     final_result = fallback_location_parsing(user_input, return_best_match)
     save_to_cache(cache_key, final_result)
     return final_result
 
-def parse_location_from_text(user_input):
+def parse_location_from_text(user_input, latency_budget=None):
     """
     兼容性函数：保持原有智能地点查询的接口不变
     """
-    return extract_location_from_text(user_input, return_best_match=False)
+    return extract_location_from_text(user_input, return_best_match=False, latency_budget=latency_budget)
 
-# ==================== 异步处理模块 ====================
+# 批量识别时每次请求DeepSeek的最大文本数
+LOCATION_BATCH_SIZE = 10
 
-def async_location_analysis_worker(card_id, found_location):
+def extract_locations_batch(user_inputs):
     """
-    异步工作函数：分析地点并更新数据库
+    批量识别多条文本的最佳匹配地点（等价于逐条调用extract_location_from_text(..., return_best_match=True)）
+
+    缓存命中和关键词高置信度匹配的文本直接返回，其余文本每LOCATION_BATCH_SIZE条合并为一次DeepSeek调用
+
+    Args:
+        user_inputs (list): 用户输入的文本列表
+
+    Returns:
+        list: 与输入一一对应的识别结果
     """
-    try:
-        print(f"开始异步分析地点: 卡片ID={card_id}, 地点='{found_location}'")
+    results = [None] * len(user_inputs)
+    pending = {}  # cache_key -> (user_input, [在输入中的位置])
+
+    for i, user_input in enumerate(user_inputs):
+        cache_key = get_cache_key(user_input, True)
+        if cache_key in pending:
+            pending[cache_key][1].append(i)
+            continue
+
+        cached_result = get_from_cache(cache_key, user_input, True)
+        if not cached_result:
+            cached_result = get_from_persistent_cache(cache_key)
+            if cached_result:
+                save_to_cache(cache_key, cached_result)
+        if cached_result:
+            results[i] = cached_result
+            continue
+
+        fallback_result = fallback_location_parsing(user_input, True)
+        if fallback_result.get('confidence', 0) >= 0.9:
+            save_to_cache(cache_key, fallback_result)
+            results[i] = fallback_result
+            continue
 
-        # 使用模块A分析地点
-        location_analysis = extract_location_from_text(found_location, return_best_match=True)
+        pending[cache_key] = (user_input, [i])
 
-        if location_analysis.get('best_match') and location_analysis.get('confidence', 0) > 0.5:
-            select_loc = location_analysis['best_match']
-            confidence = location_analysis.get('confidence', 0)
-
-            print(f"AI分析完成: '{found_location}' -> '{select_loc}' (置信度: {confidence:.2f})")
-
-            # 更新数据库
-            with app.app_context():
-                card = CampusCard.query.get(card_id)
-                if card:
-                    card.select_loc = select_loc
-                    db.session.commit()
-                    print(f"数据库更新成功: 卡片ID={card_id}, select_loc='{select_loc}'")
-                else:
-                    print(f"未找到卡片: ID={card_id}")
-        else:
-            print(f"AI分析置信度过低或未找到匹配: {location_analysis}")
+    pending_items = list(pending.items())
+    for start in range(0, len(pending_items), LOCATION_BATCH_SIZE):
+        chunk = pending_items[start:start + LOCATION_BATCH_SIZE]
+        ai_results = call_deepseek_batch([user_input for _, (user_input, _) in chunk])
 
-    except Exception as e:
-        print(f"异步地点分析失败: 卡片ID={card_id}, 错误={e}")
+        for (cache_key, (user_input, positions)), ai_result in zip(chunk, ai_results):
+            if ai_result is not None:
+                save_to_cache(cache_key, ai_result)
+                save_to_persistent_cache(cache_key, user_input, ai_result)
+                result = ai_result
+            else:
+                result = fallback_location_parsing(user_input, True)
+                # 熔断时不写入缓存，恢复后仍可由AI分析
+                if deepseek_client.is_available():
+                    save_to_cache(cache_key, result)
+            for i in positions:
+                results[i] = result
+
+    return results
 
-def start_async_location_analysis(card_id, found_location):
+def call_deepseek_batch(user_inputs):
+    """一次DeepSeek调用识别多条文本，返回与输入对应的结果列表，失败的项为None"""
+    if not deepseek_client.is_available():
+        return [None] * len(user_inputs)
+
+    location_names, pruned = select_prompt_candidates(user_inputs)
+    location_list = "、".join(location_names)
+    numbered_inputs = "\n".join(f'{i}. "{user_input}"' for i, user_input in enumerate(user_inputs))
+
+    prompt = f"""
+请分别从以下每条用户输入中识别出最可能的校园地点名称：
+{numbered_inputs}
+
+校园中的地点包括：{location_list}
+
+请返回JSON数组，每条输入对应一个元素，index为输入的编号，每条只返回最可能的一个地点：
+[
+    {{"index": 0, "best_match": "地点名称", "confidence": 0.9, "reasoning": "识别理由"}}
+]
+
+如果某条输入没有找到匹配的地点，该元素的best_match为null，confidence为0.0。
+"""
+
+    response = call_deepseek_api(
+        prompt,
+        deadline=NETWORK_CONFIG['batch_deadline'],
+        max_tokens=min(120 * len(user_inputs) + 200, 4000),
+        usage_tag='location_batch_pruned' if pruned else 'location_batch_full'
+    )
+
+    results = [None] * len(user_inputs)
+    if response:
+        try:
+            json_match = re.search(r'\[.*\]', response, re.DOTALL)
+            if json_match:
+                for item in json.loads(json_match.group()):
+                    index = item.get('index') if isinstance(item, dict) else None
+                    if isinstance(index, int) and 0 <= index < len(user_inputs):
+                        results[index] = {
+                            'best_match': item.get('best_match'),
+                            'confidence': item.get('confidence', 0.0),
+                            'reasoning': item.get('reasoning', '')
+                        }
+        except Exception as e:
+            print(f"解析DeepSeek批量响应失败: {e}")
+
+    print(f"批量AI分析完成: {len(user_inputs)}条输入，成功解析{sum(1 for r in results if r is not None)}条")
+    return results
+
+# ==================== 异步处理模块 ====================
+
+# 后台地点分析任务队列配置
+ANALYSIS_QUEUE_CONFIG = {
+    'max_workers': 2,   # 同时执行的分析任务数
+    'max_attempts': 3,  # 单个任务最多执行次数
+    'batch_size': LOCATION_BATCH_SIZE,  # 每批合并处理的任务数
+    'batch_wait': 0.5,  # 凑批最多等待的秒数
+    'retry_backoff': 30  # 首次重试前等待的秒数（与熔断恢复时间一致），之后每次加倍
+}
+
+def async_location_analysis_batch_worker(items):
     """
-    启动异步地点分析任务
+    异步工作函数：批量分析地点并更新数据库
+
+    Args:
+        items (list): [(card_id, found_location), ...]
+
+    Returns:
+        list: 与输入对应的失败原因，成功为None（供任务队列记录和重试）
     """
-    try:
-        # 创建并启动后台线程，增加错误处理
-        thread = threading.Thread(
-            target=safe_async_location_analysis_worker,
-            args=(card_id, found_location),
-            daemon=True  # 设置为守护线程，主程序退出时自动结束
-        )
-        thread.start()
-        print(f"异步分析任务已启动: 卡片ID={card_id}")
-    except Exception as e:
-        print(f"启动异步任务失败: {e}")
+    errors = [None] * len(items)
+    valid = []
+    for i, (card_id, found_location) in enumerate(items):
+        if found_location and found_location.strip():
+            valid.append((card_id, found_location.strip()))
+        else:
+            errors[i] = ValueError(f"卡片{card_id}没有可分析的地点")
+
+    if not valid:
+        return errors
 
-def safe_async_location_analysis_worker(card_id, found_location):
+    print(f"开始批量分析地点: {len(valid)}条")
+
+    # 使用模块A批量分析地点
+    analyses = extract_locations_batch([found_location for _, found_location in valid])
+
+    updates = {}
+    for (card_id, found_location), location_analysis in zip(valid, analyses):
+        if location_analysis.get('best_match') and location_analysis.get('confidence', 0) > 0.5:
+            updates[card_id] = location_analysis['best_match']
+            print(f"AI分析完成: '{found_location}' -> '{updates[card_id]}' "
+                  f"(置信度: {location_analysis.get('confidence', 0):.2f})")
+        else:
+            print(f"AI分析置信度过低或未找到匹配: '{found_location}' -> {location_analysis}")
+
+    # 一次事务更新所有卡片
+    if updates:
+        with ensure_app_context(app), write_transaction():
+            cards = CampusCard.query.filter(CampusCard.id.in_(list(updates))).all()
+            for card in cards:
+                old_bucket = hot_location_counter.card_bucket(card)
+                card.select_loc = updates[card.id]
+                # 计数从"[原始]"地点移动到标准地点，与卡片在同一事务中提交
+                hot_location_counter.move_card(old_bucket, hot_location_counter.card_bucket(card))
+        invalidate_hot_locations_cache()
+        print(f"数据库更新成功: {len(cards)}张卡片")
+
+    return errors
+
+# 持久化任务队列：固定数量的工作线程，避免报告高峰时线程数失控
+LOCATION_ANALYSIS_QUEUE = AnalysisJobQueue(
+    app,
+    async_location_analysis_batch_worker,
+    max_workers=ANALYSIS_QUEUE_CONFIG['max_workers'],
+    max_attempts=ANALYSIS_QUEUE_CONFIG['max_attempts'],
+    batch_size=ANALYSIS_QUEUE_CONFIG['batch_size'],
+    batch_wait=ANALYSIS_QUEUE_CONFIG['batch_wait'],
+    retry_backoff=ANALYSIS_QUEUE_CONFIG['retry_backoff']
+)
+
+def start_async_location_analysis(job_id, card_id):
     """
-    安全的异步工作函数：带有完整错误处理
+    把已持久化的异步地点分析任务交给工作线程
     """
     try:
-        async_location_analysis_worker(card_id, found_location)
+        LOCATION_ANALYSIS_QUEUE.submit(job_id)
+        print(f"异步分析任务已提交: 卡片ID={card_id}, 任务ID={job_id}")
     except Exception as e:
-        print(f"异步任务执行失败: 卡片ID={card_id}, 错误={e}")
-        # 记录错误但不影响主服务
-
-def calculate_semantic_relevance(user_input, location_name):
-    """
-    计算用户输入与地点名称的语义相关性得分
-    返回值范围：0.0 - 1.0，值越高表示相关性越强
-    """
-    user_input_clean = user_input.strip().lower()
-    location_clean = location_name.strip().lower()
-
-    # 1. 完全匹配 - 最高分
-    if location_clean == user_input_clean:
-        return 1.0
-
-    # 2. 地点名称完全包含在用户输入中
-    if location_clean in user_input_clean:
-        # 计算匹配长度占用户输入的比例
-        match_ratio = len(location_clean) / len(user_input_clean)
-        return 0.9 + (match_ratio * 0.1)  # 0.9-1.0之间
-
-    # 3. 用户输入完全包含在地点名称中（如用户说"南门"，地点是"东南门"）
-    if user_input_clean in location_clean:
-        # 计算匹配长度占地点名称的比例
-        match_ratio = len(user_input_clean) / len(location_clean)
-        return 0.7 + (match_ratio * 0.2)  # 0.7-0.9之间
-
-    # 4. 部分字符匹配
-    common_chars = set(user_input_clean) & set(location_clean)
-    if common_chars:
-        # 计算共同字符的比例
-        common_ratio = len(common_chars) / max(len(set(user_input_clean)), len(set(location_clean)))
-        return 0.3 + (common_ratio * 0.4)  # 0.3-0.7之间
-
-    # 5. 无匹配
-    return 0.0
+        print(f"提交异步任务失败: {e}")
 
 def fallback_location_parsing(user_input, return_best_match=False):
     """备选的地点解析方法（关键词匹配）"""
-    found_locations = []
-    user_input_lower = user_input.lower()
-
-    # 记录匹配的地点和匹配度
-    matches = []
-
-    for loc_key, loc_data in LOCATION_DB.items():
-        location_name = loc_data['name']
-        # 检查地点名称是否在用户输入中
-        if location_name in user_input:
-            # 计算语义相关性得分
-            semantic_score = calculate_semantic_relevance(user_input, location_name)
-            matches.append((location_name, semantic_score))
-            found_locations.append(location_name)
-        elif loc_key in user_input_lower:
-            # 关键词匹配，中等优先级
-            semantic_score = calculate_semantic_relevance(user_input, location_name) * 0.8
-            matches.append((location_name, semantic_score))
-            found_locations.append(location_name)
+    # 记录匹配的地点和匹配度（名称匹配按语义相关性计分，拼音关键字匹配为中等优先级）
+    matches = LOCATION_MATCHER.match(user_input)
 
     if return_best_match:
         if matches:
@@ -554,49 +753,21 @@ def fallback_location_parsing(user_input, return_best_match=False):
             "reasoning": "使用语义相关性匹配识别，按相关性排序" if sorted_locations else "未找到匹配的校园地点"
         }
 
-def calculate_distance(x1, y1, x2, y2):
-    """计算两点之间的曼哈顿距离（街区距离）"""
-    return abs(x2 - x1) + abs(y2 - y1)
-
 def find_nearest_lost_and_found(location_name):
-    """找到距离指定地点最近的招领点"""
-    # 首先找到指定地点的坐标
-    target_location = None
-    for loc_key, loc_data in LOCATION_DB.items():
-        if loc_data['name'] == location_name and loc_data['type'] == 'building':
-            target_location = loc_data
-            break
-
-    if not target_location:
-        return None
+    """找到距离指定地点最近的招领点（查预计算表）"""
+    return LOCATION_INDEX.get_nearest_lost_and_found(location_name)
 
-    # 找到所有招领点
-    lost_and_found_points = []
-    for loc_key, loc_data in LOCATION_DB.items():
-        if loc_data['type'] == 'lost_and_found':
-            distance = calculate_distance(
-                target_location['x'], target_location['y'],
-                loc_data['x'], loc_data['y']
-            )
-            lost_and_found_points.append({
-                'name': loc_data['name'],
-                'x': loc_data['x'],
-                'y': loc_data['y'],
-                'distance': distance
-            })
-
-    # 按距离排序，返回最近的
-    if lost_and_found_points:
-        lost_and_found_points.sort(key=lambda x: x['distance'])
-        return lost_and_found_points[0]
-
-    return None
+def get_template_advice(nearest_point):
+    """生成模板建议（AI不可用时的备用建议）"""
+    return f"最近的招领点是{nearest_point['name']}，距离约{nearest_point['distance']:.1f}个单位。建议您前往该地点查看是否有您丢失的物品。"
 
-def analyze_nearest_lost_and_found_with_ai(location_name, nearest_point):
-    """使用AI分析最近的招领点信息"""
-    if not nearest_point:
-        return "未找到附近的招领点"
+def build_advice_prompt(location_name, nearest_point):
+    """
+    生成招领点建议的提示词
 
+    Returns:
+        tuple: (提示词, 系统消息)
+    """
     prompt = f"""
 请为用户提供关于校园招领点的友好建议：
 
@@ -615,34 +786,89 @@ def analyze_nearest_lost_and_found_with_ai(location_name, nearest_point):
 
     # 使用专门的系统消息来生成友好建议
     system_message = "你是一个友好的校园助手，专门为学生提供实用的校园服务建议。请用亲切、友好的语言回复，提供具体实用的建议。"
+    return prompt, system_message
 
-    response = call_deepseek_api(prompt, system_message)
-    if response:
-        # 清理可能的JSON格式或其他格式化字符
-        cleaned_response = response.strip()
-        # 如果响应包含JSON格式，尝试提取实际内容
-        if cleaned_response.startswith('{') and cleaned_response.endswith('}'):
-            try:
-                import json
-                parsed = json.loads(cleaned_response)
-                # 如果是JSON格式，尝试提取建议内容
-                if isinstance(parsed, dict):
-                    if 'advice' in parsed:
-                        return parsed['advice']
-                    elif 'suggestion' in parsed:
-                        return parsed['suggestion']
-                    elif 'message' in parsed:
-                        return parsed['message']
-                    else:
-                        # 如果没有找到预期的字段，返回备用建议
-                        return f"最近的招领点是{nearest_point['name']}，距离约{nearest_point['distance']:.1f}个单位。建议您前往该地点查看是否有您丢失的物品。"
-            except:
-                # JSON解析失败，返回备用建议
-                return f"最近的招领点是{nearest_point['name']}，距离约{nearest_point['distance']:.1f}个单位。建议您前往该地点查看是否有您丢失的物品。"
-
-        return cleaned_response
-    else:
-        return f"最近的招领点是{nearest_point['name']}，距离约{nearest_point['distance']:.1f}个单位。建议您前往该地点查看是否有您丢失的物品。"
+def clean_ai_advice(response):
+    """清理AI返回的建议文本，内容不可用时返回None"""
+    if not response:
+        return None
+
+    # 清理可能的JSON格式或其他格式化字符
+    cleaned_response = response.strip()
+    # 如果响应包含JSON格式，尝试提取实际内容
+    if cleaned_response.startswith('{') and cleaned_response.endswith('}'):
+        try:
+            parsed = json.loads(cleaned_response)
+        except ValueError:
+            # JSON解析失败
+            return None
+        # 如果是JSON格式，尝试提取建议内容
+        if isinstance(parsed, dict):
+            for field in ('advice', 'suggestion', 'message'):
+                if field in parsed:
+                    return parsed[field]
+            # 没有找到预期的字段
+            return None
+
+    return cleaned_response
+
+def generate_ai_advice(location_name, nearest_point, deadline=None):
+    """调用DeepSeek生成招领点建议，失败返回None"""
+    prompt, system_message = build_advice_prompt(location_name, nearest_point)
+    response = call_deepseek_api(prompt, system_message, deadline=deadline, usage_tag='advice')
+    return clean_ai_advice(response)
+
+def is_precomputable_pair(location_name, nearest_point):
+    """是否为当前地图中建筑物与其最近招领点的组合（只有这样的组合写入预生成表）"""
+    expected = LOCATION_INDEX.get_nearest_lost_and_found(location_name)
+    return expected is not None and expected['name'] == nearest_point.get('name')
+
+def analyze_nearest_lost_and_found_with_ai(location_name, nearest_point):
+    """使用AI分析最近的招领点信息（优先使用预生成的建议）"""
+    if not nearest_point:
+        return "未找到附近的招领点"
+
+    advice = ADVICE_TABLE.get(location_name, nearest_point.get('name'))
+    if advice:
+        return advice
+
+    # DeepSeek熔断时直接返回模板建议
+    if not deepseek_client.is_available():
+        return get_template_advice(nearest_point)
+
+    # 预生成尚未覆盖（如地图刚修改）时实时生成，并补充到预生成表
+    advice = generate_ai_advice(location_name, nearest_point)
+    if not advice:
+        return get_template_advice(nearest_point)
+    if is_precomputable_pair(location_name, nearest_point):
+        try:
+            ADVICE_TABLE.add(location_name, nearest_point['name'], advice)
+        except Exception as e:
+            print(f"保存预生成建议失败: {e}")
+    return advice
+
+# 预生成AI建议表：每个建筑物与其最近招领点的建议，启动时加载并在后台补齐
+ADVICE_GENERATION_PAUSE = 0.5  # 后台生成两条建议之间的间隔（秒）
+ADVICE_TABLE = AdviceTable(
+    app,
+    lambda location_name, nearest_point: generate_ai_advice(
+        location_name, nearest_point, deadline=NETWORK_CONFIG['batch_deadline']
+    ),
+    LOCATION_DB_HASH,
+    pause=ADVICE_GENERATION_PAUSE
+)
+
+def initialize_advice_table():
+    """加载预生成建议，并在后台为缺少建议的建筑物生成"""
+    try:
+        loaded, stale_count = ADVICE_TABLE.load()
+        print(f"预生成AI建议加载完成: {loaded}条，清理旧地图条目{stale_count}条")
+        ADVICE_TABLE.start_generation(
+            LOCATION_INDEX.nearest_lost_and_found,
+            is_available=deepseek_client.is_available
+        )
+    except Exception as e:
+        print(f"加载预生成AI建议失败: {e}")
 
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
@@ -655,17 +881,28 @@ def health_check():
     """健康检查端点"""
     try:
         # 检查数据库连接
-        db.session.execute('SELECT 1')
+        db.session.execute(db.text('SELECT 1'))
         return jsonify({
             'status': 'healthy',
             'timestamp': datetime.now().isoformat(),
-            'database': 'connected'
+            'database': 'connected',
+            'deepseek_client': deepseek_client.get_stats(),
+            'deepseek_circuit': deepseek_client.circuit_breaker.get_state(),
+            'location_cache': QUERY_CACHE.get_stats(),
+            'location_cache_refresh': LOCATION_CACHE_REFRESHER.get_stats(),
+            'location_single_flight': LOCATION_SINGLE_FLIGHT.get_stats(),
+            'location_hedging': LOCATION_HEDGED_EXECUTOR.get_stats(),
+            'hot_locations_cache': HOT_LOCATIONS_CACHE.get_stats(),
+            'db_writes': WRITE_SERIALIZER.get_stats(),
+            'reward_catalog': REWARD_CATALOG.get_stats(),
+            'precomputed_advice': ADVICE_TABLE.get_stats()
         }), 200
     except Exception as e:
         return jsonify({
             'status': 'unhealthy',
             'timestamp': datetime.now().isoformat(),
-            'error': str(e)
+            'error': str(e),
+            'deepseek_circuit': deepseek_client.circuit_breaker.get_state()
         }), 500
 
 # 添加API测试端点
@@ -686,12 +923,14 @@ def test_deepseek_api():
                 'status': 'success',
                 'message': 'DeepSeek API连接正常',
                 'api_response': result,
+                'client_stats': deepseek_client.get_stats(),
                 'timestamp': datetime.now().isoformat()
             }), 200
         else:
             return jsonify({
                 'status': 'failed',
                 'message': 'DeepSeek API调用失败',
+                'client_stats': deepseek_client.get_stats(),
                 'timestamp': datetime.now().isoformat()
             }), 500
 
@@ -708,6 +947,28 @@ def ping():
     """简单的ping端点，用于保持连接"""
     return jsonify({'pong': True, 'timestamp': time.time()}), 200
 
+@app.route('/admin/analysis_jobs', methods=['GET'])
+def analysis_jobs_status():
+    """查看后台地点分析任务队列状态"""
+    try:
+        stats = LOCATION_ANALYSIS_QUEUE.get_stats()
+
+        # 最近失败的任务，便于排查
+        failed_jobs = LocationAnalysisJob.query.filter_by(status='failed').order_by(
+            LocationAnalysisJob.id.desc()
+        ).limit(10).all()
+        stats['recent_failures'] = [{
+            'job_id': job.id,
+            'card_id': job.card_id,
+            'attempts': job.attempts,
+            'last_error': job.last_error,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        } for job in failed_jobs]
+
+        return jsonify(stats), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/upload_image', methods=['POST'])
 def upload_image():
     """上传图片"""
@@ -719,20 +980,18 @@ def upload_image():
         return jsonify({'error': 'No selected file'}), 400
 
     if file and allowed_file(file.filename):
-        # 生成唯一文件名
-        filename = secure_filename(file.filename)
-        file_extension = filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-
-        # 保存文件
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
+        # 按块保存文件并检查文件头，同时生成缩略图和展示图
+        try:
+            urls = process_upload(file, app.config['UPLOAD_FOLDER'])
+        except ImageUploadError as e:
+            return jsonify({'error': str(e)}), 400
 
-        # 返回文件URL
-        file_url = f"/uploads/{unique_filename}"
+        # 返回文件URL（file_url为压缩后的展示图）
         return jsonify({
             'message': 'File uploaded successfully',
-            'file_url': file_url
+            'file_url': urls['photo_url'],
+            'thumbnail_url': urls['thumbnail_url'],
+            'original_url': urls['original_url']
         }), 200
 
     return jsonify({'error': 'Invalid file type'}), 400
@@ -757,8 +1016,8 @@ def register():
         return jsonify({'error': 'User already exists'}), 409
         
     new_user = User(student_id=student_id, full_name=full_name, password=password)
-    db.session.add(new_user)
-    db.session.commit()
+    with write_transaction():
+        db.session.add(new_user)
     
     return jsonify({'message': 'User registered successfully', 'user_id': new_user.id}), 201
 
@@ -801,6 +1060,7 @@ def report_found_card():
         handler_option = data.get('handler_option')
         contact = data.get('contact', '')
         photo_url = data.get('photo_url', '')
+        thumbnail_url = data.get('thumbnail_url', '') or photo_url
         current_user_id = data.get('current_user_id')
         current_user_name = data.get('current_user_name')
     else:
@@ -810,6 +1070,7 @@ def report_found_card():
         handler_option = request.form.get('handler_option')
         contact = request.form.get('contact', '')
         photo_url = ''
+        thumbnail_url = ''
         current_user_id = request.form.get('current_user_id')
         current_user_name = request.form.get('current_user_name')
 
@@ -817,17 +1078,15 @@ def report_found_card():
         if 'photo' in request.files:
             file = request.files['photo']
             if file and file.filename != '' and allowed_file(file.filename):
-                # 生成唯一文件名
-                filename = secure_filename(file.filename)
-                file_extension = filename.rsplit('.', 1)[1].lower()
-                unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-
-                # 保存文件
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                file.save(file_path)
+                # 按块保存文件并检查文件头，同时生成缩略图和展示图
+                try:
+                    urls = process_upload(file, app.config['UPLOAD_FOLDER'])
+                except ImageUploadError as e:
+                    return jsonify({'error': str(e)}), 400
 
-                # 设置photo_url
-                photo_url = f"/uploads/{unique_filename}"
+                # 设置photo_url（展示图）和缩略图
+                photo_url = urls['photo_url']
+                thumbnail_url = urls['thumbnail_url']
 
     # 转换handler_option为整数
     try:
@@ -856,58 +1115,74 @@ def report_found_card():
 
     # 检查卡是否已在系统中
     card = CampusCard.query.filter_by(card_number=card_number).first()
+    analyze_location = bool(found_location and found_location.strip())
 
-    if card:
-        # 更新现有卡片状态
-        card.status = 'found'
-        card.found_location = found_location
-        card.handler_option = handler_option
-        # 无论选择哪种处理方式，都将信息存储到contact字段
-        card.contact = contact.strip() if contact else None
-        card.found_time = datetime.now()
-        card.student_id = student_id  # 更新学生ID
-        card.photo_url = photo_url
-        # select_loc暂时为空，稍后异步更新
-        card.select_loc = None
-    else:
-        # 创建新记录
-        card = CampusCard(
-            card_number=card_number,
-            student_id=student_id,
-            status='found',
-            found_location=found_location,
-            handler_option=handler_option,
+    with write_transaction():
+        if card:
+            # 在写锁内读取修改前的计数桶，避免读到其他请求修改前的旧值
+            old_bucket = hot_location_counter.card_bucket(card)
+
+            # 更新现有卡片状态
+            card.status = 'found'
+            card.found_location = found_location
+            card.handler_option = handler_option
             # 无论选择哪种处理方式，都将信息存储到contact字段
-            contact=contact.strip() if contact else None,
-            photo_url=photo_url,
-            found_time=datetime.now(),
-            select_loc=None  # 暂时为空，稍后异步更新
-        )
-    
-    db.session.add(card)
-    db.session.commit()
+            card.contact = contact.strip() if contact else None
+            card.found_time = datetime.now()
+            card.student_id = student_id  # 更新学生ID
+            card.photo_url = photo_url
+            card.thumbnail_url = thumbnail_url
+            # select_loc暂时为空，稍后异步更新
+            card.select_loc = None
+        else:
+            # 创建新记录
+            card = CampusCard(
+                card_number=card_number,
+                student_id=student_id,
+                status='found',
+                found_location=found_location,
+                handler_option=handler_option,
+                # 无论选择哪种处理方式，都将信息存储到contact字段
+                contact=contact.strip() if contact else None,
+                photo_url=photo_url,
+                thumbnail_url=thumbnail_url,
+                found_time=datetime.now(),
+                select_loc=None  # 暂时为空，稍后异步更新
+            )
+            old_bucket = None
+            db.session.add(card)
+
+        # 热门地点计数与卡片在同一事务中更新
+        hot_location_counter.move_card(old_bucket, hot_location_counter.card_bucket(card))
+
+        # 异步AI分析任务与卡片在同一事务中持久化
+        analysis_job = None
+        if analyze_location:
+            db.session.flush()
+            analysis_job = LOCATION_ANALYSIS_QUEUE.create_job(card.id, found_location.strip())
+    invalidate_hot_locations_cache()
 
     # 获取卡片ID用于异步处理
     card_id = card.id
 
+    # 提交后再把任务交给工作线程
+    if analysis_job is not None:
+        start_async_location_analysis(analysis_job.id, card_id)
+
     # 自动匹配失主
     if student_id:
         owner = User.query.filter_by(student_id=student_id).first()
         if owner:
-            card.student_id = student_id
-            card.is_matched = True
-            db.session.commit()
-
-            # 启动异步AI分析任务
-            if found_location and found_location.strip():
-                start_async_location_analysis(card_id, found_location.strip())
+            with write_transaction():
+                card.student_id = student_id
+                card.is_matched = True
 
             # 为当前登录用户增加积分奖励
             points_awarded = 0
             if current_user_id and current_user_name:
                 try:
                     current_user_id = int(current_user_id)
-                    points_awarded = award_points_for_current_user(current_user_id, current_user_name)
+                    points_awarded = award_points_for_current_user(current_user_id, current_user_name, card_id)
                 except (ValueError, TypeError):
                     print(f"无效的用户ID: {current_user_id}")
 
@@ -923,16 +1198,12 @@ def report_found_card():
                     'owner_masked': mask_info(owner.full_name, owner.student_id)
                 }), 200
 
-    # 启动异步AI分析任务
-    if found_location and found_location.strip():
-        start_async_location_analysis(card_id, found_location.strip())
-
     # 为当前登录用户增加积分奖励
     points_awarded = 0
     if current_user_id and current_user_name:
         try:
             current_user_id = int(current_user_id)
-            points_awarded = award_points_for_current_user(current_user_id, current_user_name)
+            points_awarded = award_points_for_current_user(current_user_id, current_user_name, card_id)
         except (ValueError, TypeError):
             print(f"无效的用户ID: {current_user_id}")
 
@@ -983,19 +1254,28 @@ def get_real_name_by_student_id(student_id):
         print(f"查询用户姓名失败: {e}")
         return None
 
-def award_points_for_current_user(user_id, user_name):
-    """为当前登录用户增加积分奖励"""
+REPORT_CARD_REWARD_POINTS = 10  # 报告捡到校园卡奖励的积分
+
+def award_points_for_current_user(user_id, user_name, card_id=None):
+    """为当前登录用户增加积分奖励（原子更新并记录积分流水）"""
     try:
         # 根据用户ID查找用户（更准确）
         user = User.query.get(user_id)
         if user:
             # 验证用户名是否匹配（额外安全检查）
             if user.full_name == user_name:
+                student_id = user.student_id
                 # 增加10个积分
-                user.points += 10
-                db.session.commit()
-                print(f"积分奖励成功: 用户 {user_name} (ID: {user_id}, 学号: {user.student_id}) 获得10个积分，当前积分: {user.points}")
-                return 10
+                with write_transaction():
+                    balance = points_ledger.change_points(
+                        user_id, REPORT_CARD_REWARD_POINTS, points_ledger.REASON_REPORT_CARD, card_id
+                    )
+                if balance is None:
+                    print(f"积分奖励失败: 用户ID {user_id} 不存在")
+                    return 0
+                print(f"积分奖励成功: 用户 {user_name} (ID: {user_id}, 学号: {student_id}) "
+                      f"获得{REPORT_CARD_REWARD_POINTS}个积分，当前积分: {balance}")
+                return REPORT_CARD_REWARD_POINTS
             else:
                 print(f"用户名不匹配: 数据库中的姓名为 {user.full_name}，传入的姓名为 {user_name}")
                 return 0
@@ -1006,6 +1286,40 @@ def award_points_for_current_user(user_id, user_name):
         print(f"积分奖励失败: {e}")
         return 0
 
+def lost_card_query(student_id, since):
+    """学号对应的待领取校园卡查询（走student_id/status/found_time复合索引）"""
+    return CampusCard.query.filter(
+        CampusCard.student_id == student_id,
+        CampusCard.status == 'found',
+        CampusCard.found_time >= since
+    )
+
+def unmatched_cards_query(since, after=None):
+    """
+    未匹配校园卡查询（走is_matched/status/found_time复合索引），
+    外连接user表获取真实姓名，按卡片ID排序
+    """
+    query = db.session.query(
+        CampusCard.id,
+        CampusCard.student_id,
+        CampusCard.found_time,
+        CampusCard.found_location,
+        CampusCard.handler_option,
+        CampusCard.contact,
+        CampusCard.photo_url,
+        CampusCard.thumbnail_url,
+        User.full_name
+    ).outerjoin(
+        User, User.student_id == CampusCard.student_id
+    ).filter(
+        CampusCard.is_matched == False,
+        CampusCard.status == 'found',
+        CampusCard.found_time >= since
+    )
+    if after is not None:
+        query = query.filter(CampusCard.id > after)
+    return query.order_by(CampusCard.id)
+
 @app.route('/query_lost_card', methods=['GET'])
 def query_lost_card():
     """查询丢失的校园卡"""
@@ -1017,11 +1331,7 @@ def query_lost_card():
     half_month_ago = get_half_month_ago()
 
     # 查找匹配的校园卡（只查询最近半个月的记录）
-    card = CampusCard.query.filter(
-        CampusCard.student_id == student_id,
-        CampusCard.status == 'found',
-        CampusCard.found_time >= half_month_ago
-    ).first()
+    card = lost_card_query(student_id, half_month_ago).first()
     
     if card:
         # 尝试获取真实姓名
@@ -1042,7 +1352,9 @@ def query_lost_card():
                 'handler_type': 'contact',
                 'owner_name': real_name,  # 添加真实姓名字段
                 'card_id': card.id,  # 添加卡片ID用于删除操作
-                'student_id': card.student_id  # 添加学号用于权限检查
+                'student_id': card.student_id,  # 添加学号用于权限检查
+                'photo_url': card.photo_url or None,  # 压缩后的展示图
+                'thumbnail_url': card.thumbnail_url or card.photo_url or None
             }), 200
         else:
             # 放置指定地点：返回拾取点信息
@@ -1058,30 +1370,58 @@ def query_lost_card():
                 'handler_type': 'location',
                 'owner_name': real_name,  # 添加真实姓名字段
                 'card_id': card.id,  # 添加卡片ID用于删除操作
-                'student_id': card.student_id  # 添加学号用于权限检查
+                'student_id': card.student_id,  # 添加学号用于权限检查
+                'photo_url': card.photo_url or None,  # 压缩后的展示图
+                'thumbnail_url': card.thumbnail_url or card.photo_url or None
             }), 200
     
-    # 未找到匹配卡片的处理
+    # 未找到匹配卡片的处理（支持limit/after分页参数）
+    limit, after = parse_pagination_args()
+    unmatched_cards = get_unmatched_cards(limit=limit, after=after)
+    has_more = bool(limit) and len(unmatched_cards) == limit
     return jsonify({
         'status': 'not_found',
         'message': '尚未找到您的校园卡，请多关注公示信息',
-        'unmatched_cards': get_unmatched_cards()
+        'unmatched_cards': unmatched_cards,
+        'next_cursor': unmatched_cards[-1]['card_id'] if has_more else None
     }), 200
 
-def get_unmatched_cards():
-    """获取未匹配的校园卡列表（脱敏）- 只显示最近半个月的记录"""
+# 分页参数上限
+MAX_PAGE_SIZE = 100
+
+def parse_pagination_args(default_limit=None):
+    """解析limit/after分页参数，非法值按未提供处理"""
+    try:
+        limit = int(request.args.get('limit', default_limit))
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        limit = default_limit
+    try:
+        after = int(request.args.get('after'))
+    except (TypeError, ValueError):
+        after = None
+    return limit, after
+
+def get_unmatched_cards(limit=None, after=None):
+    """
+    获取未匹配的校园卡列表（脱敏）- 只显示最近半个月的记录
+
+    通过一次外连接查询同时取出失主姓名，按卡片ID排序，支持游标分页
+
+    Args:
+        limit (int): 每页最多返回的条数，None表示不分页
+        after (int): 游标，只返回ID大于该值的卡片（上一页最后一张卡片的card_id）
+    """
     # 计算半个月前的时间
     half_month_ago = get_half_month_ago()
 
     # 只查询最近半个月的未匹配校园卡
-    cards = CampusCard.query.filter(
-        CampusCard.is_matched == False,
-        CampusCard.status == 'found',
-        CampusCard.found_time >= half_month_ago
-    ).all()
+    query = unmatched_cards_query(half_month_ago, after)
+    if limit:
+        query = query.limit(limit)
 
     result = []
-    for card in cards:
+    for card in query.all():
         # 确定处理方式的显示文本
         if card.handler_option == 1:
             handler_text = "自行联系失主"
@@ -1093,8 +1433,8 @@ def get_unmatched_cards():
             handler_text = "未知处理方式"
             contact_info = "无信息"
 
-        # 尝试获取真实姓名
-        real_name = get_real_name_by_student_id(card.student_id)
+        # 真实姓名（未找到用户时为None）
+        real_name = card.full_name or None
 
         if real_name:
             # 找到了用户姓名，使用真实姓名
@@ -1115,7 +1455,9 @@ def get_unmatched_cards():
             'contact_info': contact_info,
             'owner_name': real_name,  # 真实姓名（如果有）
             'name_source': name_source,  # 姓名来源标记
-            'student_id': card.student_id  # 添加学号用于权限检查
+            'student_id': card.student_id,  # 添加学号用于权限检查
+            'photo_url': card.photo_url or None,  # 压缩后的展示图
+            'thumbnail_url': card.thumbnail_url or card.photo_url or None  # 列表页缩略图
         })
     return result
 
@@ -1143,88 +1485,124 @@ def create_forum_post():
         is_ad=is_ad,
         is_advice=is_advice
     )
-    db.session.add(post)
-    db.session.commit()
+    with write_transaction():
+        db.session.add(post)
 
     return jsonify({'message': 'Post created successfully', 'post_id': post.id}), 201
 
+FORUM_PREVIEW_MAX_LENGTH = 1000  # 预览模式下正文截断长度上限
+
+def parse_bool_arg(name):
+    """解析布尔查询参数，未提供或无法识别时返回None"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    return None
+
 @app.route('/forum/posts', methods=['GET'])
 def get_forum_posts():
-    """获取论坛帖子列表"""
-    posts = ForumPost.query.order_by(ForumPost.created_at.desc()).all()
+    """
+    获取论坛帖子列表
+
+    一次外连接查询取出作者姓名，按(created_at, id)倒序做游标分页
+
+    查询参数:
+        limit: 每页条数（最多MAX_PAGE_SIZE），提供时返回{'posts', 'next_cursor'}，
+               不提供时返回全部帖子列表（兼容旧接口）
+        after: 游标，上一页最后一个帖子的ID
+        preview: 正文预览长度，提供时只返回截断后的正文
+        is_ad / is_advice: 按帖子类型过滤（1/0）
+    """
+    limit, after = parse_pagination_args()
+
+    try:
+        preview = int(request.args.get('preview'))
+        preview = max(1, min(preview, FORUM_PREVIEW_MAX_LENGTH))
+    except (TypeError, ValueError):
+        preview = None
+
+    if preview:
+        content_column = db.func.substr(ForumPost.content, 1, preview)
+    else:
+        content_column = ForumPost.content
+
+    query = db.session.query(
+        ForumPost.id,
+        ForumPost.title,
+        content_column.label('content'),
+        db.func.length(ForumPost.content).label('content_length'),
+        ForumPost.created_at,
+        ForumPost.is_ad,
+        ForumPost.is_advice,
+        User.full_name
+    ).outerjoin(
+        User, User.id == ForumPost.author_id
+    )
+
+    is_ad = parse_bool_arg('is_ad')
+    if is_ad is not None:
+        query = query.filter(ForumPost.is_ad == is_ad)
+    is_advice = parse_bool_arg('is_advice')
+    if is_advice is not None:
+        query = query.filter(ForumPost.is_advice == is_advice)
+
+    if after is not None:
+        # 直接与游标帖子的created_at比较，避免时间格式在绑定参数中的差异
+        cursor_created_at = db.select(ForumPost.created_at).where(
+            ForumPost.id == after
+        ).scalar_subquery()
+        query = query.filter(db.or_(
+            ForumPost.created_at < cursor_created_at,
+            db.and_(ForumPost.created_at == cursor_created_at, ForumPost.id < after)
+        ))
+
+    query = query.order_by(ForumPost.created_at.desc(), ForumPost.id.desc())
+    if limit:
+        query = query.limit(limit)
+
     result = []
-    for post in posts:
-        author = User.query.get(post.author_id)
-        result.append({
+    for post in query.all():
+        item = {
             'id': post.id,
             'title': post.title,
             'content': post.content,
-            'author_name': author.full_name if author else 'Unknown',
+            'author_name': post.full_name if post.full_name else 'Unknown',
             'created_at': post.created_at.strftime('%Y-%m-%d %H:%M'),
             'is_ad': post.is_ad,
             'is_advice': post.is_advice
-        })
-    return jsonify(result), 200
+        }
+        if preview:
+            item['truncated'] = (post.content_length or 0) > preview
+        result.append(item)
+
+    if not limit:
+        return jsonify(result), 200
+
+    next_cursor = result[-1]['id'] if len(result) == limit else None
+    return jsonify({'posts': result, 'next_cursor': next_cursor}), 200
 
 @app.route('/hot_locations', methods=['GET'])
 def get_hot_locations():
-    """获取热门丢失地点（从校园卡select_loc字段统计AI分析后的标准地点）- 只统计最近半个月的记录"""
+    """
+    获取热门丢失地点（优先使用AI分析后的标准地点select_loc）
+
+    从按天维护的热门地点计数表汇总，默认统计最近半个月；
+    days参数可选HOT_LOCATIONS_WINDOWS中的窗口，其他值按默认窗口处理
+    """
     try:
-        # 计算半个月前的时间
-        half_month_ago = get_half_month_ago()
-
-        # 获取最近半个月的所有校园卡记录（不限制status，统计所有地点）
-        cards = CampusCard.query.filter(
-            CampusCard.found_time >= half_month_ago
-        ).all()
-
-        if not cards:
-            return jsonify([]), 200
-
-        # 统计地点出现频次
-        location_count = {}
-        cards_with_select_loc = 0  # 统计有select_loc的卡片数量
-
-        for card in cards:
-            # 优先使用AI分析后的标准地点名称
-            if card.select_loc and card.select_loc.strip():
-                location = card.select_loc.strip()
-                cards_with_select_loc += 1
-                if location in location_count:
-                    location_count[location] += 1
-                else:
-                    location_count[location] = 1
-            # 如果没有select_loc，回退到原始found_location（用于兼容性）
-            elif card.found_location and card.found_location.strip():
-                location = f"[原始] {card.found_location.strip()}"
-                if location in location_count:
-                    location_count[location] += 1
-                else:
-                    location_count[location] = 1
-
-        # 按频次排序，取前10个
-        sorted_locations = sorted(location_count.items(), key=lambda x: x[1], reverse=True)[:10]
-
-        # 格式化结果
-        result = []
-        total_cards = len(cards)
-
-        for location, count in sorted_locations:
-            result.append({
-                'location': location,
-                'count': count,
-                'percentage': round((count / total_cards) * 100, 1) if total_cards > 0 else 0
-            })
-
-        # 添加统计信息到响应中
-        response_data = {
-            'locations': result,
-            'statistics': {
-                'total_cards': total_cards,
-                'cards_with_ai_analysis': cards_with_select_loc,
-                'ai_analysis_coverage': round((cards_with_select_loc / total_cards) * 100, 1) if total_cards > 0 else 0
-            }
-        }
+        days = request.args.get('days', HOT_LOCATIONS_DEFAULT_WINDOW, type=int)
+        if days not in HOT_LOCATIONS_WINDOWS:
+            days = HOT_LOCATIONS_DEFAULT_WINDOW
+
+        response_data = HOT_LOCATIONS_CACHE.get(days)
+        if response_data is None:
+            response_data = hot_location_counter.query_hot_locations(days)
+            HOT_LOCATIONS_CACHE.set(days, response_data)
 
         return jsonify(response_data), 200
 
@@ -1233,17 +1611,20 @@ def get_hot_locations():
 
 @app.route('/rewards', methods=['GET'])
 def get_rewards():
-    """获取奖励列表"""
-    rewards = Reward.query.all()
-    result = []
-    for reward in rewards:
-        result.append({
-            'id': reward.id,
-            'name': reward.name,
-            'description': reward.description,
-            'points_required': reward.points_required
-        })
-    return jsonify(result), 200
+    """
+    获取奖励列表
+
+    返回内存中缓存的奖励目录，带ETag/Last-Modified；
+    客户端携带If-None-Match（或If-Modified-Since）且目录未变化时返回304
+    """
+    body, etag, last_modified = REWARD_CATALOG.get()
+
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # 允许缓存，但每次使用前都需要向服务器确认
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/reward/redeem', methods=['POST'])
 def redeem_reward():
@@ -1258,16 +1639,17 @@ def redeem_reward():
     if not user or not reward:
         return jsonify({'error': 'Invalid user or reward'}), 404
     
-    if user.points < reward.points_required:
+    # 扣除积分：余额检查和扣减在同一条UPDATE中完成，并发兑换不会透支
+    with write_transaction():
+        balance = points_ledger.change_points(
+            user.id, -(reward.points_required or 0), points_ledger.REASON_REDEEM, reward.id
+        )
+    if balance is None:
         return jsonify({'error': 'Insufficient points'}), 400
     
-    # 扣除积分
-    user.points -= reward.points_required
-    db.session.commit()
-    
     return jsonify({
         'message': f'Successfully redeemed {reward.name}',
-        'remaining_points': user.points
+        'remaining_points': balance
     }), 200
 
 @app.route('/smart_location_query', methods=['POST'])
@@ -1280,13 +1662,20 @@ def smart_location_query():
         if not user_input:
             return jsonify({'error': '请输入查询内容'}), 400
 
-        # 使用AI解析地点
-        parsing_result = parse_location_from_text(user_input)
+        # 使用AI解析地点（超出本接口的时间预算时先使用关键词匹配结果）
+        parsing_result = parse_location_from_text(
+            user_input, latency_budget=LOCATION_LATENCY_BUDGETS.get(request.endpoint)
+        )
 
         if not parsing_result['found_locations']:
+            if parsing_result.get('refining'):
+                # 关键词匹配没有结果，但AI仍在后台识别，稍后重试即可得到结果
+                message = '正在进一步分析您输入的地点，请稍后再查询一次。'
+            else:
+                message = '抱歉，无法识别您输入中的校园地点。请尝试输入更具体的地点名称。'
             return jsonify({
                 'success': False,
-                'message': '抱歉，无法识别您输入中的校园地点。请尝试输入更具体的地点名称。',
+                'message': message,
                 'parsing_result': parsing_result
             }), 200
 
@@ -1297,22 +1686,21 @@ def smart_location_query():
         for location_name in parsing_result['found_locations']:
             # 获取查询地点的坐标
             query_location_coords = None
-            for loc_key, loc_data in LOCATION_DB.items():
-                if loc_data['name'] == location_name:
-                    query_location_coords = {
-                        'x': loc_data['x'],
-                        'y': loc_data['y']
-                    }
-                    # 添加查询地点标记
-                    map_markers.append({
-                        'type': 'query_location',
-                        'name': location_name,
-                        'x': loc_data['x'],
-                        'y': loc_data['y'],
-                        'color': '#000000',  # 黑色
-                        'shape': 'square'
-                    })
-                    break
+            loc_data = LOCATION_INDEX.get_by_name(location_name)
+            if loc_data:
+                query_location_coords = {
+                    'x': loc_data['x'],
+                    'y': loc_data['y']
+                }
+                # 添加查询地点标记
+                map_markers.append({
+                    'type': 'query_location',
+                    'name': location_name,
+                    'x': loc_data['x'],
+                    'y': loc_data['y'],
+                    'color': '#000000',  # 黑色
+                    'shape': 'square'
+                })
 
             # 找到最近的招领点
             nearest_point = find_nearest_lost_and_found(location_name)
@@ -1329,8 +1717,9 @@ def smart_location_query():
                     'shape': 'circle'
                 })
 
-                # 生成快速建议作为占位符，AI建议将通过单独接口获取
-                quick_advice = f"最近的招领点是{nearest_point['name']}，距离约{nearest_point['distance']:.1f}个单位。"
+                # 有预生成的建议时直接返回；否则生成快速建议作为占位符，AI建议将通过单独接口获取
+                precomputed_advice = ADVICE_TABLE.get(location_name, nearest_point['name'])
+                quick_advice = precomputed_advice or f"最近的招领点是{nearest_point['name']}，距离约{nearest_point['distance']:.1f}个单位。"
 
                 results.append({
                     'location': location_name,
@@ -1344,7 +1733,7 @@ def smart_location_query():
                         }
                     },
                     'ai_advice': quick_advice,
-                    'ai_advice_loading': True  # 标记AI建议正在加载
+                    'ai_advice_loading': precomputed_advice is None  # 标记AI建议正在加载
                 })
             else:
                 results.append({
@@ -1372,25 +1761,39 @@ def smart_location_query():
             'error': '查询过程中发生错误，请稍后重试'
         }), 500
 
+def parse_advice_request(data):
+    """
+    解析AI建议请求的参数
+
+    Returns:
+        tuple: (地点名称, 招领点信息)，缺少参数时招领点信息为None
+    """
+    location_name = (data.get('location_name') or '').strip()
+    nearest_point_data = data.get('nearest_point')
+    if not location_name or not nearest_point_data:
+        return location_name, None
+
+    # 重构nearest_point数据
+    nearest_point = {
+        'name': nearest_point_data.get('name'),
+        'distance': nearest_point_data.get('distance'),
+        'x': nearest_point_data.get('coordinates', {}).get('x'),
+        'y': nearest_point_data.get('coordinates', {}).get('y')
+    }
+    return location_name, nearest_point
+
+def sse_event(event, data):
+    """格式化一条Server-Sent Events消息（data为JSON，保留换行等字符）"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @app.route('/get_ai_advice', methods=['POST'])
 def get_ai_advice():
-    """获取AI智能建议（流式接口）"""
+    """获取AI智能建议（一次性返回完整建议）"""
     try:
-        data = request.json
-        location_name = data.get('location_name', '').strip()
-        nearest_point_data = data.get('nearest_point')
-
-        if not location_name or not nearest_point_data:
+        location_name, nearest_point = parse_advice_request(request.json or {})
+        if nearest_point is None:
             return jsonify({'error': '缺少必要参数'}), 400
 
-        # 重构nearest_point数据
-        nearest_point = {
-            'name': nearest_point_data.get('name'),
-            'distance': nearest_point_data.get('distance'),
-            'x': nearest_point_data.get('coordinates', {}).get('x'),
-            'y': nearest_point_data.get('coordinates', {}).get('y')
-        }
-
         # 调用AI分析函数
         ai_advice = analyze_nearest_lost_and_found_with_ai(location_name, nearest_point)
 
@@ -1407,6 +1810,72 @@ def get_ai_advice():
             'error': '生成AI建议时发生错误'
         }), 500
 
+@app.route('/get_ai_advice/stream', methods=['POST'])
+def stream_ai_advice():
+    """
+    以Server-Sent Events流式返回AI智能建议
+
+    DeepSeek每生成一个片段就转发一条delta事件，最后发送done事件（包含完整建议）；
+    AI不可用或没有任何输出时以模板建议作为唯一的片段；
+    输出中途停止（上游故障、超过时长上限或max_tokens）时done事件带truncated标记。
+    客户端断开后停止读取并关闭上游连接，DeepSeek不再继续生成
+    """
+    location_name, nearest_point = parse_advice_request(request.get_json(silent=True) or {})
+    if nearest_point is None:
+        return jsonify({'error': '缺少必要参数'}), 400
+
+    prompt, system_message = build_advice_prompt(location_name, nearest_point)
+    payload = build_chat_payload(prompt, system_message, stream=True)
+    # waitress开启channel_request_lookahead后提供，用于在两个片段之间检查客户端是否已断开
+    client_disconnected = request.environ.get('waitress.client_disconnected')
+
+    precomputed_advice = ADVICE_TABLE.get(location_name, nearest_point.get('name'))
+
+    def generate():
+        if precomputed_advice:
+            yield sse_event('delta', {'delta': precomputed_advice})
+            yield sse_event('done', {'location': location_name, 'ai_advice': precomputed_advice,
+                                     'fallback': False, 'truncated': False})
+            return
+
+        received = []
+        deltas = deepseek_client.stream_chat(payload)
+        try:
+            for delta in deltas:
+                if client_disconnected is not None and client_disconnected():
+                    print(f"客户端已断开，取消AI建议生成: {location_name}")
+                    return
+                received.append(delta)
+                yield sse_event('delta', {'delta': delta})
+        except Exception as e:
+            print(f"AI建议流式生成错误: {e}")
+        finally:
+            # 服务器因客户端断开而关闭本生成器时同样会执行，上游连接随之关闭
+            deltas.close()
+
+        fallback = not received
+        truncated = False
+        if fallback:
+            advice = get_template_advice(nearest_point)
+            yield sse_event('delta', {'delta': advice})
+        else:
+            advice = ''.join(received)
+            truncated = not deltas.completed
+            if truncated:
+                print(f"AI建议不完整（{deltas.stop_reason}）: {location_name}")
+        yield sse_event('done', {
+            'location': location_name,
+            'ai_advice': advice,
+            'fallback': fallback,
+            'truncated': truncated
+        })
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # 禁止反向代理缓冲，片段立即送达浏览器
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/delete_card_record', methods=['POST'])
 def delete_card_record():
     """删除校园卡记录（将status改为'get'）"""
@@ -1432,8 +1901,8 @@ def delete_card_record():
             return jsonify({'error': '该记录无法删除'}), 400
 
         # 执行删除操作：将status改为'get'
-        card.status = 'get'
-        db.session.commit()
+        with write_transaction():
+            card.status = 'get'
 
         return jsonify({
             'success': True,
@@ -1449,7 +1918,9 @@ def delete_card_record():
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        # 创建缺少的表并为已有数据库补齐新增的字段和索引
+        upgrade_schema()
+    initialize_services()
 
     # 检查是否有waitress可用，如果有则使用生产级服务器
     try:
@@ -1465,7 +1936,9 @@ if __name__ == '__main__':
             threads=10,
             connection_limit=1000,
             cleanup_interval=30,
-            channel_timeout=120
+            channel_timeout=120,
+            # 预读请求，使流式响应能够检测到客户端断开（waitress.client_disconnected）
+            channel_request_lookahead=1
         )
     except ImportError:
         print("Waitress 未安装，使用 Flask 开发服务器...")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地点关键词匹配性能测试工具
+对比逐个地点做子串判断的旧实现与预编译的Aho-Corasick匹配器，
+并校验两者在不同规模的地点数据库上结果完全一致
+"""
+
+import json
+import random
+import timeit
+from location_matcher import LocationMatcher
+
+# 测试用的用户输入
+SAMPLE_INPUTS = [
+    "图书馆三楼",
+    "梧桐苑二楼",
+    "我在图书馆捡了钱包",
+    "东南门附近",
+    "康桥一楼",
+    "在教一楼和逸夫科学楼之间的路上",
+    "tushuguan",
+    "主E旁边的自行车棚",
+    "西南篮球场",
+    "不知道在哪里丢的",
+]
+
+
+def calculate_semantic_relevance(user_input, location_name):
+    """旧实现的语义相关性评分（app.py改用LocationMatcher前的实现，仅保留在此作为对照）"""
+    user_input_clean = user_input.strip().lower()
+    location_clean = location_name.strip().lower()
+
+    if location_clean == user_input_clean:
+        return 1.0
+
+    if location_clean in user_input_clean:
+        match_ratio = len(location_clean) / len(user_input_clean)
+        return 0.9 + (match_ratio * 0.1)
+
+    if user_input_clean in location_clean:
+        match_ratio = len(user_input_clean) / len(location_clean)
+        return 0.7 + (match_ratio * 0.2)
+
+    common_chars = set(user_input_clean) & set(location_clean)
+    if common_chars:
+        common_ratio = len(common_chars) / max(len(set(user_input_clean)), len(set(location_clean)))
+        return 0.3 + (common_ratio * 0.4)
+
+    return 0.0
+
+
+def legacy_match(location_db, user_input):
+    """旧实现：逐个地点做子串判断"""
+    user_input_lower = user_input.lower()
+    matches = []
+    for loc_key, loc_data in location_db.items():
+        location_name = loc_data['name']
+        if location_name in user_input:
+            matches.append((location_name, calculate_semantic_relevance(user_input, location_name)))
+        elif loc_key in user_input_lower:
+            matches.append((location_name, calculate_semantic_relevance(user_input, location_name) * 0.8))
+    return matches
+
+
+def load_location_database():
+    """加载地点数据库"""
+    with open('location_database.json', 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_synthetic_database(base_db, size, seed=0):
+    """在真实地点数据库基础上生成指定规模的合成数据库"""
+    rng = random.Random(seed)
+    chars = "东南西北中楼馆苑院园场门厅堂室桥路湖山教科文理工"
+    synthetic = dict(base_db)
+    while len(synthetic) < size:
+        index = len(synthetic)
+        name = "".join(rng.choice(chars) for _ in range(rng.randint(2, 5))) + str(index)
+        synthetic[f"loc{index}"] = {"type": "building", "x": 0, "y": 0, "name": name}
+    return synthetic
+
+
+def verify_results(location_db, matcher):
+    """校验新旧实现结果一致"""
+    for user_input in SAMPLE_INPUTS:
+        expected = legacy_match(location_db, user_input)
+        actual = matcher.match(user_input)
+        if expected != actual:
+            print(f"❌ 结果不一致: {user_input}\n  旧实现: {expected}\n  新实现: {actual}")
+            return False
+    return True
+
+
+def run_benchmark(sizes=(81, 500, 2000, 10000), number=200):
+    """在不同规模的数据库上对比两种实现的耗时"""
+    base_db = load_location_database()
+
+    print(f"{'地点数':>8} {'旧实现(μs/次)':>16} {'新实现(μs/次)':>16} {'加速比':>8} {'结果一致':>8}")
+    print("-" * 64)
+
+    all_consistent = True
+    for size in sizes:
+        location_db = build_synthetic_database(base_db, size)
+        matcher = LocationMatcher(location_db)
+
+        consistent = verify_results(location_db, matcher)
+        all_consistent = all_consistent and consistent
+
+        legacy_time = timeit.timeit(
+            lambda: [legacy_match(location_db, text) for text in SAMPLE_INPUTS], number=number
+        )
+        matcher_time = timeit.timeit(
+            lambda: [matcher.match(text) for text in SAMPLE_INPUTS], number=number
+        )
+
+        calls = number * len(SAMPLE_INPUTS)
+        legacy_us = legacy_time / calls * 1e6
+        matcher_us = matcher_time / calls * 1e6
+        print(f"{size:>8} {legacy_us:>16.1f} {matcher_us:>16.1f} "
+              f"{legacy_us / matcher_us:>7.1f}x {'✅' if consistent else '❌':>8}")
+
+    return all_consistent
+
+
+if __name__ == "__main__":
+    print("=" * 64)
+    print("地点关键词匹配性能测试")
+    print("=" * 64)
+
+    if run_benchmark():
+        print("\n🎉 所有规模下新旧实现结果一致")
+    else:
+        print("\n⚠️ 存在结果不一致的情况，请检查location_matcher.py")
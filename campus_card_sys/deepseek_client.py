@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DeepSeek API客户端模块
+进程内共享一个带连接池的requests Session，避免每次调用都重新建立TCP+TLS连接
+"""
+
+import os
+import json
+import time
+import random
+import socket
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import ReadTimeoutError
+
+
+class ClientStats:
+    """客户端统计：请求数、新建连接数、重试与超出时间预算次数等"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {
+            'requests': 0,
+            'new_connections': 0,
+            'retries': 0,
+            'deadline_exceeded': 0,
+            'short_circuited': 0,
+            'client_errors': 0,     # 认证失败、请求参数错误等4xx（不计入熔断）
+            'streams': 0,
+            'streams_cancelled': 0,
+            'streams_truncated': 0   # 达到总时长上限或max_tokens而不完整的流式回复
+        }
+        # 按调用类型统计的token用量：类型 -> {calls, prompt_tokens, completion_tokens}
+        self._usage = {}
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def record_usage(self, tag, usage):
+        """记录一次调用的token用量（接口返回的usage字段）"""
+        with self._lock:
+            entry = self._usage.setdefault(tag, {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+            entry['calls'] += 1
+            entry['prompt_tokens'] += usage.get('prompt_tokens') or 0
+            entry['completion_tokens'] += usage.get('completion_tokens') or 0
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._counters)
+            usage = {tag: dict(entry) for tag, entry in self._usage.items()}
+        # 请求数与新建连接数之差即为复用的连接数
+        requests_count = stats['requests']
+        reused = max(requests_count - stats['new_connections'], 0)
+        stats['reused_connections'] = reused
+        stats['reuse_ratio'] = round(reused / requests_count, 3) if requests_count else 0.0
+        for entry in usage.values():
+            entry['avg_prompt_tokens'] = round(entry['prompt_tokens'] / entry['calls'], 1)
+        stats['usage'] = usage
+        return stats
+
+
+class CircuitBreaker:
+    """
+    熔断器：closed（正常）→ open（熔断，直接拒绝）→ half_open（放行一个探测请求）
+
+    连续失败达到阈值后熔断，经过recovery_timeout秒后进入半开状态，
+    探测成功则恢复，失败则再次熔断
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, recovery_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._trip_count = 0
+        self._rejected_count = 0
+
+    def _recovery_due(self):
+        return time.monotonic() - self._opened_at >= self.recovery_timeout
+
+    def is_available(self):
+        """只查询状态，不占用半开状态下的探测名额"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                return self._recovery_due()
+            return not self._probe_in_flight
+
+    def allow_request(self):
+        """判断本次请求是否放行"""
+        with self._lock:
+            if self._state == self.OPEN and self._recovery_due():
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+                print("DeepSeek熔断器进入半开状态，放行探测请求")
+
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+
+            self._rejected_count += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                print("DeepSeek熔断器探测成功，恢复正常")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._trip_count += 1
+                    print(f"DeepSeek熔断器打开: 连续失败{self._consecutive_failures}次，"
+                          f"{self.recovery_timeout}秒内直接使用备选方案")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def get_state(self):
+        """获取熔断器状态信息"""
+        with self._lock:
+            state = self._state
+            if state == self.OPEN and self._recovery_due():
+                state = self.HALF_OPEN
+            retry_in = None
+            if self._state == self.OPEN:
+                retry_in = max(round(self.recovery_timeout - (time.monotonic() - self._opened_at), 1), 0)
+            return {
+                'state': state,
+                'consecutive_failures': self._consecutive_failures,
+                'trip_count': self._trip_count,
+                'rejected_requests': self._rejected_count,
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout': self.recovery_timeout,
+                'retry_in_seconds': retry_in
+            }
+
+
+def _make_counting_pool_class(base_class, stats):
+    """生成一个在新建连接时计数的连接池类"""
+
+    class CountingConnectionPool(base_class):
+        def _new_conn(self):
+            stats.incr('new_connections')
+            return super()._new_conn()
+
+    return CountingConnectionPool
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    带连接计数和TCP keep-alive的HTTP适配器
+    直连和通过代理（HTTP(S)_PROXY）两种情况下的连接池都计数并开启keep-alive
+    """
+
+    def __init__(self, stats, keep_alive=True, **kwargs):
+        self._stats = stats
+        self._keep_alive = keep_alive
+        super().__init__(**kwargs)
+
+    def _apply_socket_options(self, pool_kwargs):
+        if self._keep_alive:
+            socket_options = list(HTTPConnection.default_socket_options)
+            socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            pool_kwargs['socket_options'] = socket_options
+        return pool_kwargs
+
+    def _count_new_connections(self, manager):
+        # 在管理器原有的连接池类（SOCKS代理时为SOCKS连接池）上增加计数
+        manager.pool_classes_by_scheme = {
+            scheme: _make_counting_pool_class(pool_class, self._stats)
+            for scheme, pool_class in manager.pool_classes_by_scheme.items()
+        }
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, **self._apply_socket_options(pool_kwargs))
+        self._count_new_connections(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        """通过代理访问时requests使用单独的代理管理器，不经过init_poolmanager"""
+        if proxy in self.proxy_manager:
+            return self.proxy_manager[proxy]
+        manager = super().proxy_manager_for(proxy, **self._apply_socket_options(proxy_kwargs))
+        self._count_new_connections(manager)
+        return manager
+
+
+class ChatStream:
+    """
+    stream_chat的返回值：迭代得到回复的文本片段
+
+    迭代结束后completed表示是否收到了完整回复；不完整时stop_reason说明原因：
+    max_duration（达到总时长上限）、length（达到max_tokens）、idle_timeout（上游长时间没有输出）、
+    error（请求失败或响应格式错误）、http_<状态码>、short_circuited（熔断中）、cancelled（调用方关闭）
+    """
+
+    def __init__(self):
+        self.completed = False
+        self.stop_reason = None
+        self._chunks = None
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        """关闭上游连接（未读完时服务端随之停止生成）"""
+        self._chunks.close()
+
+
+class DeepSeekClient:
+    """DeepSeek客户端：进程内长期存在，所有调用共享同一个连接池"""
+
+    # 需要重试的HTTP状态码（频率限制和服务端错误）
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    @staticmethod
+    def is_upstream_failure(status_code):
+        """只有频率限制和服务端错误说明上游异常；认证失败、请求错误不计入熔断"""
+        return status_code == 429 or status_code >= 500
+
+    def __init__(self, api_key, api_url, connect_timeout=30, read_timeout=90,
+                 verify_ssl=True, pool_maxsize=10, keep_alive=True,
+                 deadline=20, backoff_factor=1, backoff_max=4, circuit_breaker=None,
+                 stream_idle_timeout=15, stream_max_duration=120):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.verify_ssl = verify_ssl
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.deadline = deadline
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.stream_idle_timeout = stream_idle_timeout  # 流式回复两个片段之间的最长间隔（秒）
+        self.stream_max_duration = stream_max_duration  # 流式回复的最长总时长（秒）
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+        self.stats = ClientStats()
+        self.proxies = self._get_proxy_config()
+        self.session = self._create_session()
+
+    def _get_proxy_config(self):
+        """获取代理配置（用于启动日志；请求时由requests按NO_PROXY等环境变量决定是否走代理）"""
+        proxies = {}
+
+        http_proxy = os.environ.get('HTTP_PROXY') or os.environ.get('http_proxy')
+        https_proxy = os.environ.get('HTTPS_PROXY') or os.environ.get('https_proxy')
+
+        if http_proxy:
+            proxies['http'] = http_proxy
+        if https_proxy:
+            proxies['https'] = https_proxy
+
+        return proxies
+
+    def _create_session(self):
+        """创建带连接池的session"""
+        session = requests.Session()
+        session.headers.update({
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json',
+            'User-Agent': 'CampusCardSystem/1.0',
+            'Accept': 'application/json',
+            'Connection': 'keep-alive'
+        })
+        # 保留trust_env：代理、NO_PROXY、REQUESTS_CA_BUNDLE/CURL_CA_BUNDLE和.netrc仍按环境变量生效
+
+        adapter = PooledHTTPAdapter(
+            self.stats,
+            keep_alive=self.keep_alive,
+            pool_connections=1,
+            pool_maxsize=self.pool_maxsize,
+            # 不使用urllib3的Retry，重试统一由chat()在时间预算内完成
+            max_retries=0
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        # 不把代理写入session.proxies，否则会覆盖NO_PROXY的排除规则
+        if self.proxies:
+            print(f"使用代理设置: {self.proxies}")
+
+        return session
+
+    def get_timeout(self, remaining=None):
+        """获取超时配置：(连接超时, 读取超时)，不超过剩余时间预算"""
+        if remaining is None:
+            return (self.connect_timeout, self.read_timeout)
+        return (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+
+    def post(self, payload, timeout=None):
+        """通过共享连接池发送请求"""
+        self.stats.incr('requests')
+        return self.session.post(
+            self.api_url,
+            json=payload,
+            timeout=timeout or self.get_timeout(),
+            verify=self.verify_ssl
+        )
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        """计算退避时间：带随机抖动的指数退避，服务端给出Retry-After时以其为下限"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    def is_available(self):
+        """熔断器未打开时可以调用"""
+        return self.circuit_breaker.is_available()
+
+    def chat(self, payload, max_retries=3, deadline=None, usage_tag='other'):
+        """
+        调用聊天接口，返回回复内容，失败返回None
+
+        所有重试都在deadline（秒）的总时间预算内完成，预算不足时立即放弃，
+        由调用方走备选方案，避免长时间占用waitress工作线程。
+        熔断器打开时不发起请求，直接返回None。
+        只有超时、连接错误、429和5xx计入熔断器的失败次数；认证失败和请求错误
+        说明上游可以正常应答，计入client_errors统计，不触发熔断。
+        成功调用的token用量按usage_tag分类记录，便于比较不同提示词的开销
+        """
+        if not self.circuit_breaker.allow_request():
+            self.stats.incr('short_circuited')
+            print("DeepSeek熔断器已打开，跳过API调用")
+            return None
+
+        content, upstream_failed = self._chat_with_retries(payload, max_retries, deadline, usage_tag)
+        if upstream_failed:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return content
+
+    def _chat_with_retries(self, payload, max_retries, deadline, usage_tag):
+        """
+        在时间预算内带退避重试地发送请求
+
+        Returns:
+            tuple: (回复内容, 是否为上游故障)；失败时回复内容为None
+        """
+        budget = deadline if deadline is not None else self.deadline
+        deadline_at = time.monotonic() + budget
+
+        for attempt in range(1, max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                self.stats.incr('deadline_exceeded')
+                print(f"DeepSeek API时间预算（{budget}秒）已用完，放弃调用")
+                return None, True
+
+            retry_after = None
+            try:
+                print(f"DeepSeek API调用尝试 {attempt}/{max_retries}")
+                response = self.post(payload, timeout=self.get_timeout(remaining))
+                print(f"API响应状态码: {response.status_code}")
+
+                if response.status_code == 200:
+                    result = response.json()
+                    content = result['choices'][0]['message']['content']
+                    usage = result.get('usage') or {}
+                    self.stats.record_usage(usage_tag, usage)
+                    print(f"API调用成功，返回内容长度: {len(content)}，"
+                          f"提示词tokens: {usage.get('prompt_tokens')}（{usage_tag}）")
+                    return content, False
+                elif response.status_code in self.RETRY_STATUS_CODES:
+                    print(f"DeepSeek API可重试错误: {response.status_code}, {response.text}")
+                    retry_after = response.headers.get('Retry-After')
+                elif self.is_upstream_failure(response.status_code):
+                    print(f"DeepSeek API服务端错误: {response.status_code}, {response.text}")
+                    return None, True
+                else:
+                    self.stats.incr('client_errors')
+                    if response.status_code == 401:
+                        print(f"DeepSeek API认证失败: API密钥可能无效或已过期")
+                    else:
+                        print(f"DeepSeek API请求错误: {response.status_code}, {response.text}")
+                    return None, False
+
+            except requests.exceptions.Timeout as e:
+                print(f"DeepSeek API超时错误 (尝试 {attempt}/{max_retries}): {e}")
+            except requests.exceptions.ConnectionError as e:
+                print(f"DeepSeek API连接错误 (尝试 {attempt}/{max_retries}): {e}")
+            except requests.exceptions.RequestException as e:
+                print(f"DeepSeek API请求异常 (尝试 {attempt}/{max_retries}): {e}")
+            except (ValueError, KeyError, IndexError) as e:
+                print(f"DeepSeek API响应格式错误: {e}")
+                return None, False
+
+            if attempt == max_retries:
+                break
+
+            wait_time = self._backoff_delay(attempt, retry_after)
+            if time.monotonic() + wait_time >= deadline_at:
+                self.stats.incr('deadline_exceeded')
+                print(f"剩余时间预算不足以等待 {wait_time:.1f} 秒，快速失败")
+                return None, True
+
+            self.stats.incr('retries')
+            print(f"等待 {wait_time:.1f} 秒后重试...")
+            time.sleep(wait_time)
+
+        print("所有重试都失败，API调用最终失败")
+        return None, True
+
+    def stream_chat(self, payload, idle_timeout=None, max_duration=None):
+        """
+        以流式方式调用聊天接口，返回逐个产出回复文本片段的ChatStream
+
+        服务端以SSE格式返回增量（data: {...}，以data: [DONE]结束），
+        收到一个片段就立即产出，不等待完整回复。不做重试：开始输出后无法重来，
+        失败时迭代直接结束，由调用方根据是否已有输出、回复是否完整决定如何展示。
+        调用方提前关闭（如客户端断开）时关闭上游连接，服务端随之停止生成
+
+        Args:
+            idle_timeout (float): 等待首个片段以及两个片段之间的最长秒数，超时视为上游故障
+            max_duration (float): 整个回复的最长秒数，达到后停止读取，回复标记为不完整，
+                上游仍在正常输出，不计入熔断
+        """
+        stream = ChatStream()
+        stream._chunks = self._stream_chunks(
+            stream,
+            payload,
+            idle_timeout if idle_timeout is not None else self.stream_idle_timeout,
+            max_duration if max_duration is not None else self.stream_max_duration
+        )
+        return stream
+
+    def _stream_chunks(self, stream, payload, idle_timeout, max_duration):
+        if not self.circuit_breaker.allow_request():
+            self.stats.incr('short_circuited')
+            stream.stop_reason = 'short_circuited'
+            print("DeepSeek熔断器已打开，跳过流式API调用")
+            return
+
+        ends_at = time.monotonic() + max_duration
+        payload = dict(payload, stream=True)
+        response = None
+        upstream_failed = False
+        try:
+            self.stats.incr('requests')
+            self.stats.incr('streams')
+            response = self.session.post(
+                self.api_url,
+                json=payload,
+                # 流式响应的读取超时即首个片段和两个片段之间的最长间隔
+                timeout=(self.connect_timeout, idle_timeout),
+                verify=self.verify_ssl,
+                headers={'Accept': 'text/event-stream'},
+                stream=True
+            )
+            if response.status_code != 200:
+                print(f"DeepSeek流式API错误: {response.status_code}, {response.text}")
+                stream.stop_reason = f'http_{response.status_code}'
+                if self.is_upstream_failure(response.status_code):
+                    upstream_failed = True
+                else:
+                    self.stats.incr('client_errors')
+                return
+
+            # text/event-stream不带charset时requests会按ISO-8859-1解码
+            response.encoding = 'utf-8'
+            # chunk_size=None：收到一个分块就处理一个，不凑满固定字节数
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if time.monotonic() >= ends_at:
+                    self.stats.incr('streams_truncated')
+                    stream.stop_reason = 'max_duration'
+                    print(f"DeepSeek流式回复超过{max_duration}秒上限，停止读取（回复不完整）")
+                    return
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                choice = json.loads(data)['choices'][0]
+                if choice.get('finish_reason') == 'length':
+                    # 达到max_tokens，回复被截断
+                    stream.stop_reason = 'length'
+                delta = choice.get('delta', {}).get('content')
+                if delta:
+                    yield delta
+
+            # 没有[DONE]也视为正常结束（连接由服务端关闭）
+            if stream.stop_reason == 'length':
+                self.stats.incr('streams_truncated')
+            else:
+                stream.completed = True
+        except GeneratorExit:
+            # 调用方不再需要后续内容，不算作上游失败
+            self.stats.incr('streams_cancelled')
+            stream.stop_reason = 'cancelled'
+            raise
+        except requests.exceptions.RequestException as e:
+            # 读取流式响应时的读取超时被requests包装为ConnectionError(ReadTimeoutError)
+            if isinstance(e, requests.exceptions.Timeout) or (e.args and isinstance(e.args[0], ReadTimeoutError)):
+                print(f"DeepSeek流式API超过{idle_timeout}秒没有输出: {e}")
+                stream.stop_reason = 'idle_timeout'
+            else:
+                print(f"DeepSeek流式API请求异常: {e}")
+                stream.stop_reason = 'error'
+            upstream_failed = True
+        except (ValueError, KeyError, IndexError) as e:
+            print(f"DeepSeek流式API响应格式错误: {e}")
+            stream.stop_reason = 'error'
+        finally:
+            if response is not None:
+                # 未读完的流式响应直接关闭连接，不放回连接池
+                response.close()
+            if upstream_failed:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+
+    def get_stats(self):
+        """获取客户端统计信息"""
+        stats = self.stats.snapshot()
+        stats['pool_maxsize'] = self.pool_maxsize
+        return stats
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
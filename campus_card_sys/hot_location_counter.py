@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热门地点计数模块
+按(发现日期, 地点)维护校园卡数量的物化计数表hot_location_counter，
+报告卡片和后台分析写入select_loc时增量更新，
+统计最近N天的热门地点只需汇总N天内的少量计数行
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from models import db, CampusCard, HotLocationCounter
+from db_config import write_transaction
+
+RAW_LOCATION_PREFIX = '[原始] '  # 尚未经过AI分析的原始地点
+NO_LOCATION = ''  # 没有任何地点信息的卡片：计入总数但不参与排名
+
+
+def location_bucket(select_loc, found_location):
+    """
+    卡片所属的地点计数桶
+
+    Returns:
+        tuple: (地点名称, 是否为AI分析后的标准地点)
+    """
+    if select_loc and select_loc.strip():
+        return select_loc.strip(), True
+    if found_location and found_location.strip():
+        return f"{RAW_LOCATION_PREFIX}{found_location.strip()}", False
+    return NO_LOCATION, False
+
+
+def card_bucket(card):
+    """
+    卡片当前所在的计数桶
+
+    Returns:
+        tuple: (日期, 地点名称, 是否为AI分析结果)，没有发现时间的卡片返回None
+    """
+    if card.found_time is None:
+        return None
+    location, is_ai = location_bucket(card.select_loc, card.found_location)
+    return card.found_time.date(), location, is_ai
+
+
+def adjust_counter(day, location, is_ai, delta):
+    """在当前事务中给计数桶加上delta（不提交）"""
+    filters = {'day': day, 'location': location, 'is_ai': is_ai}
+    updated = HotLocationCounter.query.filter_by(**filters).update(
+        {'count': HotLocationCounter.count + delta}, synchronize_session=False
+    )
+    if updated:
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(HotLocationCounter(count=delta, **filters))
+    except IntegrityError:
+        # 其他事务刚插入了同一个计数桶，改为累加
+        HotLocationCounter.query.filter_by(**filters).update(
+            {'count': HotLocationCounter.count + delta}, synchronize_session=False
+        )
+
+
+def move_card(old_bucket, new_bucket):
+    """
+    卡片从一个计数桶移动到另一个（不提交，需与卡片的修改在同一事务中提交）
+
+    Args:
+        old_bucket: 修改前card_bucket(card)的结果，新卡片为None
+        new_bucket: 修改后card_bucket(card)的结果
+    """
+    if old_bucket == new_bucket:
+        return
+    if old_bucket is not None:
+        adjust_counter(*old_bucket, -1)
+    if new_bucket is not None:
+        adjust_counter(*new_bucket, 1)
+
+
+def rebuild_counters():
+    """根据campus_card表全量重建计数表（需在应用上下文中调用）"""
+    counts = {}
+    rows = db.session.query(
+        CampusCard.found_time, CampusCard.select_loc, CampusCard.found_location
+    ).filter(CampusCard.found_time.isnot(None)).yield_per(1000)
+    for row in rows:
+        bucket = card_bucket(row)
+        counts[bucket] = counts.get(bucket, 0) + 1
+
+    with write_transaction():
+        HotLocationCounter.query.delete(synchronize_session=False)
+        for (day, location, is_ai), count in counts.items():
+            db.session.add(HotLocationCounter(day=day, location=location, is_ai=is_ai, count=count))
+    return len(counts)
+
+
+def ensure_counters():
+    """计数表为空而已有校园卡记录时（如首次升级）执行一次回填"""
+    if HotLocationCounter.query.first() is not None:
+        return 0
+    if CampusCard.query.filter(CampusCard.found_time.isnot(None)).first() is None:
+        return 0
+    return rebuild_counters()
+
+
+def window_counts_query(start_day):
+    """start_day及之后各地点的卡片数量汇总查询（走(day, location, is_ai)唯一索引）"""
+    return db.session.query(
+        HotLocationCounter.location,
+        HotLocationCounter.is_ai,
+        db.func.sum(HotLocationCounter.count).label('count')
+    ).filter(
+        HotLocationCounter.day >= start_day
+    ).group_by(HotLocationCounter.location, HotLocationCounter.is_ai)
+
+
+def query_hot_locations(days, limit=10):
+    """
+    统计最近days天（含今天）的热门地点
+
+    Returns:
+        dict/list: 热门地点及统计信息，窗口内没有记录时返回空列表
+    """
+    start_day = (datetime.now() - timedelta(days=days - 1)).date()
+    rows = window_counts_query(start_day).all()
+
+    rows = [row for row in rows if row.count]
+    if not rows:
+        return []
+
+    total_cards = sum(row.count for row in rows)
+    cards_with_select_loc = sum(row.count for row in rows if row.is_ai)
+
+    # 按频次排序，取前limit个
+    ranked = sorted(
+        (row for row in rows if row.location != NO_LOCATION),
+        key=lambda row: row.count, reverse=True
+    )[:limit]
+
+    # 格式化结果
+    result = []
+    for row in ranked:
+        result.append({
+            'location': row.location,
+            'count': row.count,
+            'percentage': round((row.count / total_cards) * 100, 1) if total_cards > 0 else 0
+        })
+
+    return {
+        'locations': result,
+        'statistics': {
+            'days': days,
+            'total_cards': total_cards,
+            'cards_with_ai_analysis': cards_with_select_loc,
+            'ai_analysis_coverage': round((cards_with_select_loc / total_cards) * 100, 1) if total_cards > 0 else 0
+        }
+    }
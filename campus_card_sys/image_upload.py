@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片上传处理模块
+上传文件按块写入磁盘，根据文件头识别真实格式并检查大小；
+每张图片另外生成缩略图和压缩后的展示图，列表页面只需加载小图
+
+缩略图和展示图依赖Pillow（可选），未安装时两者都使用原图
+"""
+
+import os
+import io
+import uuid
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    ImageOps = None
+    PIL_AVAILABLE = False
+
+CHUNK_SIZE = 64 * 1024                 # 每次写入磁盘的块大小
+MAX_UPLOAD_BYTES = 16 * 1024 * 1024    # 单个文件大小上限
+MAX_IMAGE_PIXELS = 40 * 1000 * 1000    # 解码前检查像素数，防止解压炸弹
+
+THUMBNAIL_SIZE = (240, 240)            # 列表页缩略图
+DISPLAY_SIZE = (1280, 1280)            # 展示图最大尺寸
+DISPLAY_MAX_BYTES = 300 * 1024         # 展示图大小上限
+JPEG_QUALITIES = (85, 75, 65, 55)      # 展示图超出大小上限时逐步降低质量
+
+# 文件头 -> 扩展名
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+SNIFF_BYTES = max(len(signature) for signature, _ in IMAGE_SIGNATURES)
+
+
+class ImageUploadError(ValueError):
+    """上传的文件不是允许的图片或超出大小限制"""
+
+
+def sniff_image_type(header):
+    """根据文件头识别图片格式，无法识别时返回None"""
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    return None
+
+
+def _read_header(stream):
+    """读取足够识别格式的文件头（流可能一次返回不足的字节）"""
+    header = b''
+    while len(header) < SNIFF_BYTES:
+        chunk = stream.read(SNIFF_BYTES - len(header))
+        if not chunk:
+            break
+        header += chunk
+    return header
+
+
+def save_upload_stream(file_storage, upload_folder, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    按块将上传文件写入磁盘
+
+    Args:
+        file_storage: werkzeug的FileStorage
+        upload_folder (str): 保存目录
+        max_bytes (int): 文件大小上限
+
+    Returns:
+        tuple: (文件ID, 原图文件名)
+
+    Raises:
+        ImageUploadError: 文件内容不是PNG/JPEG/GIF或超出大小上限
+    """
+    stream = file_storage.stream
+    header = _read_header(stream)
+    extension = sniff_image_type(header)
+    if extension is None:
+        raise ImageUploadError('Invalid file type')
+
+    file_id = uuid.uuid4().hex
+    filename = f"{file_id}.{extension}"
+    path = os.path.join(upload_folder, filename)
+    temp_path = f"{path}.part"
+
+    size = len(header)
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(header)
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImageUploadError('File too large')
+                f.write(chunk)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return file_id, filename
+
+
+def _to_rgb(image):
+    """转换为JPEG可保存的RGB图像，透明部分填充白色"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode_jpeg(image, qualities):
+    """按质量从高到低编码，返回第一个不超过大小上限的结果（都超出时返回最低质量）"""
+    data = None
+    for quality in qualities:
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+        data = buffer.getvalue()
+        if len(data) <= DISPLAY_MAX_BYTES:
+            break
+    return data
+
+
+def generate_derivatives(upload_folder, file_id, original_filename):
+    """
+    生成缩略图和展示图
+
+    Returns:
+        dict: {'photo_url': 展示图, 'thumbnail_url': 缩略图, 'original_url': 原图}
+    """
+    urls = {
+        'photo_url': f"/uploads/{original_filename}",
+        'thumbnail_url': f"/uploads/{original_filename}",
+        'original_url': f"/uploads/{original_filename}"
+    }
+    if not PIL_AVAILABLE:
+        return urls
+
+    original_path = os.path.join(upload_folder, original_filename)
+    try:
+        with Image.open(original_path) as image:
+            width, height = image.size
+            if width * height > MAX_IMAGE_PIXELS:
+                raise ImageUploadError('Image dimensions too large')
+
+            # JPEG可在解码时直接按比例缩小，减少大图的解码开销
+            image.draft('RGB', DISPLAY_SIZE)
+            image = ImageOps.exif_transpose(image)
+            image = _to_rgb(image)
+
+            display = image.copy()
+            display.thumbnail(DISPLAY_SIZE)
+            display_filename = f"{file_id}_display.jpg"
+            with open(os.path.join(upload_folder, display_filename), 'wb') as f:
+                f.write(_encode_jpeg(display, JPEG_QUALITIES))
+
+            thumbnail = image.copy()
+            thumbnail.thumbnail(THUMBNAIL_SIZE)
+            thumbnail_filename = f"{file_id}_thumb.jpg"
+            thumbnail.save(os.path.join(upload_folder, thumbnail_filename), 'JPEG', quality=75, optimize=True)
+
+        urls['photo_url'] = f"/uploads/{display_filename}"
+        urls['thumbnail_url'] = f"/uploads/{thumbnail_filename}"
+    except ImageUploadError:
+        raise
+    except Exception as e:
+        # 文件头正确但无法解码时保留原图
+        print(f"生成缩略图失败: {original_filename}, 错误={e}")
+
+    return urls
+
+
+def process_upload(file_storage, upload_folder):
+    """
+    保存上传图片并生成缩略图和展示图
+
+    Returns:
+        dict: {'photo_url', 'thumbnail_url', 'original_url'}
+
+    Raises:
+        ImageUploadError: 文件不是允许的图片或超出限制
+    """
+    file_id, original_filename = save_upload_stream(file_storage, upload_folder)
+    try:
+        return generate_derivatives(upload_folder, file_id, original_filename)
+    except ImageUploadError:
+        os.remove(os.path.join(upload_folder, original_filename))
+        raise
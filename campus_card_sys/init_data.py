@@ -1,6 +1,8 @@
 # init_data.py
 from app import app
-from models import db, User, CampusCard, ForumPost, Reward
+from models import db, User, CampusCard, ForumPost, Reward, PointsLedger
+from hot_location_counter import rebuild_counters
+from points_ledger import record_opening_balances
 from datetime import datetime
 
 def init_test_data():
@@ -10,6 +12,7 @@ def init_test_data():
         db.create_all()
         
         # 清空现有数据
+        db.session.query(PointsLedger).delete()
         db.session.query(User).delete()
         db.session.query(CampusCard).delete()
         db.session.query(ForumPost).delete()
@@ -258,8 +261,15 @@ def init_test_data():
         for reward in test_rewards:
             db.session.add(reward)
         
+        # 测试用户的初始积分记为期初余额
+        db.session.flush()
+        record_opening_balances()
+
         # 提交所有更改
         db.session.commit()
+
+        # 重建热门地点计数
+        rebuild_counters()
         print("测试数据初始化完成！")
         print("测试用户:")
         print("- 学号: 2021001, 姓名: 张三, 密码: 123456, 积分: 100")
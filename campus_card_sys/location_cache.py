@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地点识别结果缓存模块
+线程安全、有容量上限的LRU缓存，条目按TTL过期；
+可设置过期后仍可返回旧值的时间（stale-while-revalidate），由后台刷新
+"""
+
+import time
+import heapq
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class LRUTTLCache:
+    """
+    LRU + TTL缓存
+
+    - 超过max_entries时淘汰最久未使用的条目
+    - 读取时惰性检查过期；写入时只从过期时间小顶堆的堆顶清理已过期条目，
+      单次操作的开销与缓存大小无关
+    - 每个条目有软过期时间（写入后ttl秒）和硬过期时间（再加stale_ttl秒）：
+      两者之间的条目仍可读取，但标记为需要刷新；stale_ttl为0时两者相同
+    """
+
+    def __init__(self, max_entries=1000, ttl=7200, stale_ttl=0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (value, soft_expires_at, hard_expires_at)
+        self._expiry_heap = []      # (hard_expires_at, key)，可能包含已被覆盖的旧记录
+
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get_entry(self, key):
+        """
+        获取缓存值及其是否已超过软过期时间
+
+        Returns:
+            tuple: (值, 是否需要刷新)；不存在或已超过硬过期时间返回(None, False)
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._misses += 1
+                return None, False
+
+            value, soft_expires_at, hard_expires_at = entry
+            now = time.monotonic()
+            if now >= hard_expires_at:
+                del self._data[key]
+                self._expirations += 1
+                self._misses += 1
+                return None, False
+
+            self._data.move_to_end(key)
+            self._hits += 1
+            stale = now >= soft_expires_at
+            if stale:
+                self._stale_hits += 1
+            return value, stale
+
+    def get(self, key):
+        """获取缓存值（软过期后、硬过期前仍返回旧值），不存在或已过期返回None"""
+        return self.get_entry(key)[0]
+
+    def set(self, key, value, ttl=None):
+        """写入缓存（ttl为软过期时间，硬过期时间再加stale_ttl）"""
+        now = time.monotonic()
+        soft_expires_at = now + (ttl if ttl is not None else self.ttl)
+        hard_expires_at = soft_expires_at + self.stale_ttl
+
+        with self._lock:
+            self._data[key] = (value, soft_expires_at, hard_expires_at)
+            self._data.move_to_end(key)
+            heapq.heappush(self._expiry_heap, (hard_expires_at, key))
+
+            self._purge_expired_locked(now)
+
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+            # 堆中的旧记录过多时重建，防止无限增长
+            if len(self._expiry_heap) > 2 * self.max_entries:
+                self._expiry_heap = [(hard, k) for k, (_, _, hard) in self._data.items()]
+                heapq.heapify(self._expiry_heap)
+
+    def delete(self, key):
+        """删除缓存条目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _purge_expired_locked(self, now):
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self._data.get(key)
+            # 只有过期时间一致才说明是当前条目，否则是被覆盖前的旧记录
+            if entry is not None and entry[2] == expires_at:
+                del self._data[key]
+                self._expirations += 1
+
+    def purge_expired(self):
+        """清理所有已过期的条目"""
+        with self._lock:
+            self._purge_expired_locked(time.monotonic())
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self._expiry_heap = []
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'hits': self._hits,
+                'stale_hits': self._stale_hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 3) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations
+            }
+
+
+class _InFlightCall:
+    """正在进行中的一次计算"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    合并并发的相同请求：同一个key同时只执行一次计算，
+    其余调用方等待并共享这次计算的结果
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+        self._executed = 0
+        self._coalesced = 0
+
+    def do(self, key, fn):
+        """执行fn()，若相同key的计算正在进行则等待其结果"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._coalesced += 1
+                is_leader = False
+            else:
+                call = _InFlightCall()
+                self._calls[key] = call
+                self._executed += 1
+                is_leader = True
+
+        if not is_leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def get_stats(self):
+        """获取合并统计信息"""
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self._executed,
+                'coalesced': self._coalesced
+            }
+
+
+class BackgroundRefresher:
+    """
+    后台刷新过期的缓存条目：同一个key同时只刷新一次，
+    同时进行的刷新数达到上限时放弃本次刷新（调用方继续使用旧值，下次读取时再尝试）
+    """
+
+    def __init__(self, max_concurrent=2, thread_name_prefix='cache-refresh'):
+        self.max_concurrent = max_concurrent
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix=thread_name_prefix)
+
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+        self._started = 0
+        self._skipped = 0   # 达到并发上限而放弃的次数
+        self._failed = 0
+
+    def submit(self, key, fn):
+        """
+        在后台执行fn()刷新key对应的条目
+
+        Returns:
+            bool: 是否已开始刷新（该key正在刷新或达到并发上限时返回False）
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            if len(self._refreshing) >= self.max_concurrent:
+                self._skipped += 1
+                return False
+            self._refreshing.add(key)
+            self._started += 1
+
+        self._executor.submit(self._run, key, fn)
+        return True
+
+    def _run(self, key, fn):
+        try:
+            fn()
+        except Exception as e:
+            with self._lock:
+                self._failed += 1
+            print(f"后台刷新缓存失败: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_stats(self):
+        """获取刷新统计信息"""
+        with self._lock:
+            return {
+                'in_progress': len(self._refreshing),
+                'max_concurrent': self.max_concurrent,
+                'started': self._started,
+                'skipped': self._skipped,
+                'failed': self._failed
+            }
+
+
+class HedgedExecutor:
+    """
+    带时间预算的后台执行：计算在后台线程中进行，调用方最多等待budget秒，
+    超时后先使用自己的备选结果返回，计算继续执行直至完成（结果由计算本身写入缓存）
+
+    同时进行的计算数不超过工作线程数：全部线程都被仍在后台执行的计算占用时，
+    不再提交新的计算（否则会在队列中无限堆积，排到时早已超出预算），调用方直接使用备选结果
+    """
+
+    def __init__(self, max_workers=4, thread_name_prefix='hedged'):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+        self._lock = threading.Lock()
+        self._in_flight = 0            # 已提交、尚未完成的计算数
+        self._in_budget = 0            # 预算内完成的次数
+        self._budget_exceeded = 0      # 超出预算、改用备选结果的次数
+        self._skipped = 0              # 达到并发上限、未提交直接改用备选结果的次数
+        self._background_completed = 0  # 超出预算后在后台完成的次数
+        self._background_failed = 0
+
+    def run(self, fn, budget):
+        """
+        在后台线程执行fn()并最多等待budget秒
+
+        Returns:
+            tuple: (是否在预算内完成, 结果)；超时返回(False, None)，fn在后台继续执行；
+            达到并发上限时不执行fn，返回(None, None)。fn在预算内抛出的异常直接向调用方抛出
+        """
+        with self._lock:
+            if self._in_flight >= self.max_workers:
+                self._skipped += 1
+                return None, None
+            self._in_flight += 1
+
+        future = self._executor.submit(fn)
+        future.add_done_callback(self._release)
+        try:
+            result = future.result(timeout=budget)
+        except FutureTimeoutError:
+            with self._lock:
+                self._budget_exceeded += 1
+            future.add_done_callback(self._on_background_done)
+            return False, None
+
+        with self._lock:
+            self._in_budget += 1
+        return True, result
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _on_background_done(self, future):
+        error = future.exception()
+        with self._lock:
+            if error is None:
+                self._background_completed += 1
+            else:
+                self._background_failed += 1
+        if error is not None:
+            print(f"后台计算失败: {error}")
+
+    def get_stats(self):
+        """获取执行统计信息"""
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'max_workers': self.max_workers,
+                'in_budget': self._in_budget,
+                'budget_exceeded': self._budget_exceeded,
+                'skipped': self._skipped,
+                'background_completed': self._background_completed,
+                'background_failed': self._background_failed
+            }
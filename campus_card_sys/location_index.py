@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地点索引模块
+加载地点数据库时建立名称索引、类型索引和网格空间索引，
+并预先计算每个建筑物最近的招领点
+"""
+
+import math
+
+
+def manhattan_distance(x1, y1, x2, y2):
+    """计算两点之间的曼哈顿距离（街区距离）"""
+    return abs(x2 - x1) + abs(y2 - y1)
+
+
+class GridIndex:
+    """
+    均匀网格空间索引（曼哈顿距离）
+
+    k近邻查询从查询点所在网格向外逐圈扩展，
+    已找到的第k近距离不超过已搜索范围时即可停止
+    """
+
+    def __init__(self, records, cell_size=100):
+        self.cell_size = cell_size
+        self._cells = {}
+        self._size = 0
+        self._min_cell = None
+        self._max_cell = None
+
+        for record in records:
+            cell = self._cell_of(record['x'], record['y'])
+            self._cells.setdefault(cell, []).append(record)
+            self._size += 1
+            if self._min_cell is None:
+                self._min_cell = list(cell)
+                self._max_cell = list(cell)
+            else:
+                self._min_cell = [min(self._min_cell[0], cell[0]), min(self._min_cell[1], cell[1])]
+                self._max_cell = [max(self._max_cell[0], cell[0]), max(self._max_cell[1], cell[1])]
+
+    def __len__(self):
+        return self._size
+
+    def _cell_of(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def _ring(self, center, radius):
+        """返回与中心网格切比雪夫距离恰好为radius的所有网格"""
+        cx, cy = center
+        if radius == 0:
+            return [center]
+        cells = []
+        for dx in range(-radius, radius + 1):
+            cells.append((cx + dx, cy - radius))
+            cells.append((cx + dx, cy + radius))
+        for dy in range(-radius + 1, radius):
+            cells.append((cx - radius, cy + dy))
+            cells.append((cx + radius, cy + dy))
+        return cells
+
+    def _max_radius(self, center):
+        """覆盖所有非空网格所需的最大圈数"""
+        return max(
+            abs(center[0] - self._min_cell[0]), abs(center[0] - self._max_cell[0]),
+            abs(center[1] - self._min_cell[1]), abs(center[1] - self._max_cell[1])
+        )
+
+    def k_nearest(self, x, y, k=1):
+        """
+        查询距离(x, y)最近的k个点
+
+        Returns:
+            list: [(距离, 记录), ...]，按距离从近到远排列，距离相同时保持数据库顺序
+        """
+        if not self._size or k <= 0:
+            return []
+
+        center = self._cell_of(x, y)
+        max_radius = self._max_radius(center)
+        candidates = []
+
+        for radius in range(max_radius + 1):
+            for cell in self._ring(center, radius):
+                for record in self._cells.get(cell, ()):
+                    candidates.append((manhattan_distance(x, y, record['x'], record['y']), record['order'], record))
+
+            # 第radius+1圈及以外的点与查询点的曼哈顿距离至少为radius * cell_size
+            if len(candidates) >= k:
+                candidates.sort(key=lambda item: (item[0], item[1]))
+                if candidates[k - 1][0] <= radius * self.cell_size:
+                    break
+
+        candidates.sort(key=lambda item: (item[0], item[1]))
+        return [(distance, record) for distance, _, record in candidates[:k]]
+
+    def within_radius(self, x, y, radius):
+        """
+        查询与(x, y)曼哈顿距离不超过radius的所有点
+
+        Returns:
+            list: [(距离, 记录), ...]，按距离从近到远排列
+        """
+        if not self._size:
+            return []
+
+        min_cell = self._cell_of(x - radius, y - radius)
+        max_cell = self._cell_of(x + radius, y + radius)
+        results = []
+        for cell_x in range(max(min_cell[0], self._min_cell[0]), min(max_cell[0], self._max_cell[0]) + 1):
+            for cell_y in range(max(min_cell[1], self._min_cell[1]), min(max_cell[1], self._max_cell[1]) + 1):
+                for record in self._cells.get((cell_x, cell_y), ()):
+                    distance = manhattan_distance(x, y, record['x'], record['y'])
+                    if distance <= radius:
+                        results.append((distance, record['order'], record))
+
+        results.sort(key=lambda item: (item[0], item[1]))
+        return [(distance, record) for distance, _, record in results]
+
+
+class LocationIndex:
+    """地点数据库索引"""
+
+    def __init__(self, location_db, cell_size=100):
+        self.records = []
+        self.by_name = {}   # 名称 -> 记录列表（数据库顺序）
+        self.by_type = {}   # 类型 -> 记录列表（数据库顺序）
+
+        for order, (loc_key, loc_data) in enumerate(location_db.items()):
+            record = {
+                'key': loc_key,
+                'name': loc_data['name'],
+                'type': loc_data['type'],
+                'x': loc_data['x'],
+                'y': loc_data['y'],
+                'order': order
+            }
+            self.records.append(record)
+            self.by_name.setdefault(record['name'], []).append(record)
+            self.by_type.setdefault(record['type'], []).append(record)
+
+        # 每种类型一个空间索引，另有一个包含全部地点的索引
+        self.spatial = {
+            loc_type: GridIndex(records, cell_size)
+            for loc_type, records in self.by_type.items()
+        }
+        self.spatial[None] = GridIndex(self.records, cell_size)
+
+        # 预先计算每个建筑物最近的招领点
+        self.nearest_lost_and_found = {}
+        for record in self.by_type.get('building', []):
+            if record['name'] in self.nearest_lost_and_found:
+                continue
+            nearest = self.k_nearest(record['x'], record['y'], k=1, loc_type='lost_and_found')
+            if nearest:
+                distance, point = nearest[0]
+                self.nearest_lost_and_found[record['name']] = {
+                    'name': point['name'],
+                    'x': point['x'],
+                    'y': point['y'],
+                    'distance': distance
+                }
+
+    def get_by_name(self, name, loc_type=None):
+        """按名称查找地点（同名时返回数据库中的第一个），可限定类型"""
+        for record in self.by_name.get(name, ()):
+            if loc_type is None or record['type'] == loc_type:
+                return record
+        return None
+
+    def get_by_type(self, loc_type):
+        """获取指定类型的所有地点"""
+        return self.by_type.get(loc_type, [])
+
+    def k_nearest(self, x, y, k=1, loc_type=None):
+        """查询距离(x, y)最近的k个地点，可限定类型"""
+        grid = self.spatial.get(loc_type)
+        return grid.k_nearest(x, y, k) if grid else []
+
+    def within_radius(self, x, y, radius, loc_type=None):
+        """查询与(x, y)距离不超过radius的地点，可限定类型"""
+        grid = self.spatial.get(loc_type)
+        return grid.within_radius(x, y, radius) if grid else []
+
+    def get_nearest_lost_and_found(self, location_name):
+        """获取建筑物最近的招领点（预计算结果）"""
+        nearest = self.nearest_lost_and_found.get(location_name)
+        return dict(nearest) if nearest else None
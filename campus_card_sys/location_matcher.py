@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地点关键词匹配模块
+根据location_database.json一次性构建Aho-Corasick自动机，
+对用户输入扫描一遍即可找出所有出现的地点名称和拼音关键字
+"""
+
+from collections import deque
+
+
+class AhoCorasick:
+    """Aho-Corasick多模式匹配自动机"""
+
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns (list): [(pattern, pattern_id), ...]
+        """
+        self._goto = [{}]     # 每个节点的转移表
+        self._fail = [0]      # 失配指针
+        self._output = [[]]   # 到达该节点时匹配到的模式id
+
+        for pattern, pattern_id in patterns:
+            if pattern:
+                self._add(pattern, pattern_id)
+        self._build_fail_links()
+
+    def _add(self, pattern, pattern_id):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append(pattern_id)
+
+    def _build_fail_links(self):
+        pending = deque(self._goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for char, child in self._goto[node].items():
+                pending.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # 合并失配节点的输出，匹配时无需再沿失配链查找
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_all(self, text):
+        """扫描一遍文本，返回出现过的所有模式id"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+
+class LocationMatcher:
+    """
+    地点匹配器：预先计算每个地点用于语义相关性评分的特征，
+    匹配结果与逐个地点做子串判断的结果完全一致
+    """
+
+    def __init__(self, location_db, category_keywords=None):
+        """
+        Args:
+            location_db (dict): 地点数据库
+            category_keywords (dict): 泛称 -> 名称片段元组，如{'食堂': ('梧桐苑', '康桥苑')}，
+                输入中出现泛称时，名称包含任一片段的地点参与候选排序（仅rank使用）
+        """
+        self._names = []       # 按数据库顺序的地点名称
+        self._cleaned = []     # 名称去空格小写
+        self._char_sets = []   # 名称的字符集合
+        self._bigrams = []     # 名称的相邻二字组合
+
+        name_patterns = []
+        key_patterns = []
+        for index, (loc_key, loc_data) in enumerate(location_db.items()):
+            location_name = loc_data['name']
+            location_clean = location_name.strip().lower()
+
+            self._names.append(location_name)
+            self._cleaned.append(location_clean)
+            self._char_sets.append(set(location_clean))
+            self._bigrams.append(self._to_bigrams(location_clean))
+
+            # 名称在原始输入中匹配，拼音关键字在小写输入中匹配
+            name_patterns.append((location_name, index))
+            key_patterns.append((loc_key, index))
+
+        self._name_automaton = AhoCorasick(name_patterns)
+        self._key_automaton = AhoCorasick(key_patterns)
+
+        # 泛称 -> 对应地点下标
+        category_keywords = category_keywords or {}
+        self._category_members = []
+        category_patterns = []
+        for word, fragments in category_keywords.items():
+            members = {index for index, location_clean in enumerate(self._cleaned)
+                       if any(fragment.lower() in location_clean for fragment in fragments)}
+            category_patterns.append((word.lower(), len(self._category_members)))
+            self._category_members.append(members)
+        self._category_automaton = AhoCorasick(category_patterns)
+
+    @staticmethod
+    def _to_bigrams(text):
+        return {text[i:i + 2] for i in range(len(text) - 1)}
+
+    def relevance(self, user_input_clean, user_chars, index):
+        """计算用户输入与地点的语义相关性得分（与benchmark_location_matcher.py中的旧实现一致）"""
+        location_clean = self._cleaned[index]
+
+        # 1. 完全匹配 - 最高分
+        if location_clean == user_input_clean:
+            return 1.0
+
+        # 2. 地点名称完全包含在用户输入中
+        if location_clean in user_input_clean:
+            match_ratio = len(location_clean) / len(user_input_clean)
+            return 0.9 + (match_ratio * 0.1)
+
+        # 3. 用户输入完全包含在地点名称中
+        if user_input_clean in location_clean:
+            match_ratio = len(user_input_clean) / len(location_clean)
+            return 0.7 + (match_ratio * 0.2)
+
+        # 4. 部分字符匹配
+        location_chars = self._char_sets[index]
+        common_chars = user_chars & location_chars
+        if common_chars:
+            common_ratio = len(common_chars) / max(len(user_chars), len(location_chars))
+            return 0.3 + (common_ratio * 0.4)
+
+        # 5. 无匹配
+        return 0.0
+
+    def match(self, user_input):
+        """
+        找出用户输入中出现的所有地点
+
+        Returns:
+            list: [(地点名称, 语义相关性得分), ...]，按数据库顺序排列；
+            名称匹配的得分为相关性得分，仅拼音关键字匹配的得分乘以0.8
+        """
+        name_hits = self._name_automaton.find_all(user_input)
+        key_hits = self._key_automaton.find_all(user_input.lower())
+        if not name_hits and not key_hits:
+            return []
+
+        user_input_clean = user_input.strip().lower()
+        user_chars = set(user_input_clean)
+
+        matches = []
+        for index in sorted(name_hits | key_hits):
+            score = self.relevance(user_input_clean, user_chars, index)
+            if index not in name_hits:
+                # 关键词匹配，中等优先级
+                score *= 0.8
+            matches.append((self._names[index], score))
+        return matches
+
+    def rank(self, user_input, top_k=None):
+        """
+        对所有地点打分并排序（用于挑选发送给AI的候选地点）
+
+        与match不同，没有直接出现在输入中的地点也参与计分，以便召回错别字和泛称：
+        - 拼音关键字或泛称（如"食堂"）出现在输入中的地点至少得0.8分
+        - 与输入有相同二字组合的地点（如"图书管"与"图书馆"）得0.6~0.9分
+        - 其余地点按字符重合度计分（只有零散单字重合时低于0.5分）
+
+        Returns:
+            list: [(地点名称, 得分), ...]，只包含得分大于0的地点，按得分从高到低排列，
+            得分相同时按语义相关性、再按数据库顺序排列，同名地点只保留一个
+        """
+        user_input_clean = user_input.strip().lower()
+        if not user_input_clean:
+            return []
+        user_chars = set(user_input_clean)
+        user_bigrams = self._to_bigrams(user_input_clean)
+        key_hits = self._key_automaton.find_all(user_input.lower())
+        category_hits = set()
+        for category_id in self._category_automaton.find_all(user_input_clean):
+            category_hits |= self._category_members[category_id]
+
+        scored = []
+        for index in range(len(self._names)):
+            relevance = self.relevance(user_input_clean, user_chars, index)
+            score = relevance
+            if index in key_hits or index in category_hits:
+                score = max(score, 0.8)
+            shared_bigrams = user_bigrams & self._bigrams[index]
+            if shared_bigrams:
+                score = max(score, 0.6 + 0.3 * len(shared_bigrams) / len(self._bigrams[index]))
+            if score > 0:
+                scored.append((-score, -relevance, index))
+        scored.sort()
+
+        ranked = []
+        seen = set()
+        for negative_score, _, index in scored:
+            name = self._names[index]
+            if name in seen:
+                continue
+            seen.add(name)
+            ranked.append((name, -negative_score))
+            if top_k is not None and len(ranked) >= top_k:
+                break
+        return ranked
@@ -1,91 +1,66 @@
 #!/usr/bin/env python3
 # migrate_db.py - 数据库迁移脚本
 
-import sqlite3
-import os
+import sys
+from datetime import date, datetime
 from app import app
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
 from models import db
+import schema_migration
 
 def migrate_database():
-    """迁移数据库，添加contact和select_loc字段"""
+    """
+    迁移数据库：创建缺少的表，并为已有表补充模型中新增的字段（如contact、select_loc）
+    （服务启动时也会执行同样的迁移，见schema_migration.py）
+    """
 
-    # 数据库文件路径
-    db_path = 'campus_card.db'
-
-    if not os.path.exists(db_path):
-        print("数据库文件不存在，将创建新的数据库")
-        with app.app_context():
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        if not inspector.get_table_names():
+            print("数据库中没有任何表，将创建新的数据库")
             db.create_all()
-        print("✓ 新数据库创建完成")
-        return
-
-    # 连接数据库
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+            print("✓ 新数据库创建完成")
+            return
 
-    try:
-        # 检查字段是否已存在
-        cursor.execute("PRAGMA table_info(campus_card)")
-        columns = [column[1] for column in cursor.fetchall()]
-
-        # 添加contact字段
-        if 'contact' not in columns:
-            print("正在添加contact字段...")
-            cursor.execute("ALTER TABLE campus_card ADD COLUMN contact VARCHAR(20)")
-            print("✓ contact字段添加成功")
-        else:
-            print("✓ contact字段已存在")
-
-        # 添加select_loc字段
-        if 'select_loc' not in columns:
-            print("正在添加select_loc字段...")
-            cursor.execute("ALTER TABLE campus_card ADD COLUMN select_loc VARCHAR(100)")
-            print("✓ select_loc字段添加成功")
-        else:
-            print("✓ select_loc字段已存在")
-
-        # 提交更改
-        conn.commit()
-        print("✓ 数据库迁移完成")
-
-    except Exception as e:
-        print(f"✗ 数据库迁移出错: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        try:
+            schema_migration.migrate_schema()
+            print("✓ 数据库迁移完成")
+        except Exception as e:
+            print(f"✗ 数据库迁移出错: {e}")
 
 def update_existing_records():
     """为现有记录更新select_loc字段"""
 
     with app.app_context():
         from models import CampusCard
-        from app import extract_location_from_text
+        from app import extract_locations_batch, LOCATION_BATCH_SIZE
 
         # 获取所有没有select_loc的记录
         cards = CampusCard.query.filter(
             CampusCard.select_loc.is_(None),
             CampusCard.found_location.isnot(None)
         ).all()
+        cards = [card for card in cards if card.found_location and card.found_location.strip()]
 
         print(f"找到{len(cards)}条需要更新的记录")
 
         updated_count = 0
-        for card in cards:
-            if card.found_location and card.found_location.strip():
-                try:
-                    # 使用模块A分析地点
-                    location_analysis = extract_location_from_text(
-                        card.found_location.strip(),
-                        return_best_match=True
-                    )
-
-                    if location_analysis.get('best_match') and location_analysis.get('confidence', 0) > 0.5:
-                        card.select_loc = location_analysis['best_match']
-                        updated_count += 1
-                        print(f"更新记录 {card.id}: '{card.found_location}' -> '{card.select_loc}'")
-
-                except Exception as e:
-                    print(f"分析记录 {card.id} 失败: {e}")
+        # 每批合并为一次AI调用
+        for start in range(0, len(cards), LOCATION_BATCH_SIZE):
+            batch = cards[start:start + LOCATION_BATCH_SIZE]
+            try:
+                # 使用模块A批量分析地点
+                analyses = extract_locations_batch([card.found_location.strip() for card in batch])
+            except Exception as e:
+                print(f"分析记录 {[card.id for card in batch]} 失败: {e}")
+                continue
+
+            for card, location_analysis in zip(batch, analyses):
+                if location_analysis.get('best_match') and location_analysis.get('confidence', 0) > 0.5:
+                    card.select_loc = location_analysis['best_match']
+                    updated_count += 1
+                    print(f"更新记录 {card.id}: '{card.found_location}' -> '{card.select_loc}'")
 
         if updated_count > 0:
             db.session.commit()
@@ -93,37 +68,117 @@ def update_existing_records():
         else:
             print("没有记录需要更新")
 
-def show_table_structure():
-    """显示表结构"""
-    db_path = 'campus_card.db'
+def create_missing_indexes():
+    """为已有数据库补建模型中声明的索引"""
+
+    with app.app_context():
+        schema_migration.create_missing_indexes()
+
+def rebuild_hot_location_counters():
+    """根据校园卡记录重建热门地点计数表"""
 
-    if not os.path.exists(db_path):
-        print("数据库文件不存在")
-        return
+    with app.app_context():
+        from hot_location_counter import rebuild_counters
+        buckets = rebuild_counters()
+        print(f"✓ 热门地点计数重建完成: {buckets}个计数桶")
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def backfill_points_ledger():
+    """为启用积分流水前已有积分的用户补记期初余额"""
 
+    with app.app_context():
+        from db_config import write_transaction
+        from points_ledger import record_opening_balances
+        with write_transaction():
+            count = record_opening_balances()
+        print(f"✓ 积分流水期初余额补记完成: {count}个用户")
+
+def explain_query_plan(query):
+    """返回SQLite对查询的EXPLAIN QUERY PLAN结果（每一步的描述）"""
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    params = []
+    for name in compiled.positiontup:
+        value = compiled.params[name]
+        # 查询计划与参数取值无关，日期时间按字符串绑定即可
+        if isinstance(value, (date, datetime)):
+            value = str(value)
+        params.append(value)
+
+    # pysqlite按SQL文本缓存预编译语句，缓存中的EXPLAIN语句在索引变更后仍返回旧的计划，
+    # 因此使用不缓存语句、用完即关闭的独立连接
+    engine = create_engine(db.engine.url, poolclass=NullPool, connect_args={'cached_statements': 0})
     try:
-        print("\n当前campus_card表结构:")
-        print("-" * 50)
-        cursor.execute("PRAGMA table_info(campus_card)")
-        columns = cursor.fetchall()
-
-        for column in columns:
-            _, name, type_, notnull, _, pk = column
-            nullable = "NOT NULL" if notnull else "NULL"
-            primary = "PRIMARY KEY" if pk else ""
-            print(f"{name:15} {type_:15} {nullable:10} {primary}")
-
-    except Exception as e:
-        print(f"查询表结构出错: {e}")
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", tuple(params)).fetchall()
     finally:
-        conn.close()
+        engine.dispose()
+    return [row[-1] for row in rows]
+
+def check_query_plans():
+    """
+    检查热点查询都能走索引，避免表结构改动后悄悄退化为全表扫描
+
+    Returns:
+        bool: 所有查询都使用了索引时返回True
+    """
+
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            print(f"跳过查询计划检查（当前数据库为{db.engine.dialect.name}）")
+            return True
+
+        from app import lost_card_query, unmatched_cards_query, get_half_month_ago
+        from hot_location_counter import window_counts_query
+
+        since = get_half_month_ago()
+        # (说明, 表名, 查询, 期望使用的索引；None表示任意索引)
+        checks = [
+            ('按学号查询校园卡', 'campus_card', lost_card_query('2021001', since),
+             'ix_campus_card_student_status_found_time'),
+            ('未匹配校园卡列表', 'campus_card', unmatched_cards_query(since),
+             'ix_campus_card_matched_status_found_time'),
+            ('热门地点统计', 'hot_location_counter', window_counts_query(since.date()), None),
+        ]
+
+        all_passed = True
+        for description, table, query, expected_index in checks:
+            plan = explain_query_plan(query)
+            # 对该表的访问必须是带索引的SEARCH，不能是SCAN
+            steps = [step for step in plan if step.split(' ')[1:2] == [table]]
+            passed = bool(steps) and all(
+                step.startswith('SEARCH') and 'INDEX' in step for step in steps
+            )
+            if expected_index:
+                passed = passed and any(f"INDEX {expected_index} " in step for step in steps)
+            all_passed = all_passed and passed
+            print(f"{'✓' if passed else '✗'} {description}: {' | '.join(plan)}")
+
+        return all_passed
+
+def show_table_structure():
+    """显示表结构"""
+
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        if 'campus_card' not in inspector.get_table_names():
+            print("campus_card表不存在")
+            return
+
+        try:
+            print("\n当前campus_card表结构:")
+            print("-" * 50)
+            primary_keys = set(inspector.get_pk_constraint('campus_card').get('constrained_columns') or [])
+
+            for column in inspector.get_columns('campus_card'):
+                nullable = "NULL" if column['nullable'] else "NOT NULL"
+                primary = "PRIMARY KEY" if column['name'] in primary_keys else ""
+                print(f"{column['name']:15} {str(column['type']):15} {nullable:10} {primary}")
+
+        except Exception as e:
+            print(f"查询表结构出错: {e}")
 
 if __name__ == '__main__':
     print("=" * 50)
-    print("数据库迁移工具 - 添加select_loc字段")
+    print("数据库迁移工具")
     print("=" * 50)
 
     # 显示当前表结构
@@ -132,11 +187,31 @@ if __name__ == '__main__':
     # 执行迁移
     migrate_database()
 
+    # 补建索引
+    print("\n开始检查索引...")
+    create_missing_indexes()
+
     # 更新现有记录
     print("\n开始更新现有记录...")
     update_existing_records()
 
+    # 重建热门地点计数
+    print("\n开始重建热门地点计数...")
+    rebuild_hot_location_counters()
+
+    # 补记积分流水期初余额
+    print("\n开始检查积分流水...")
+    backfill_points_ledger()
+
+    # 检查热点查询的执行计划
+    print("\n开始检查查询计划...")
+    plans_ok = check_query_plans()
+
     # 显示迁移后的表结构
     show_table_structure()
 
+    if not plans_ok:
+        print("\n✗ 存在未使用索引的热点查询，请检查模型中的索引定义")
+        sys.exit(1)
+
     print("\n迁移完成！")
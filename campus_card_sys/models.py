@@ -16,12 +16,19 @@ class CampusCard(db.Model):
     student_id = db.Column(db.String(20), nullable=False)
     status = db.Column(db.String(20), default='normal')  # normal/found/get
     found_location = db.Column(db.String(100))
-    found_time = db.Column(db.DateTime)
+    found_time = db.Column(db.DateTime, index=True)
     handler_option = db.Column(db.Integer)  # 1:自行联系 2:放卡处
     photo_url = db.Column(db.String(200))
+    thumbnail_url = db.Column(db.String(200))  # 列表页使用的缩略图
     contact = db.Column(db.String(20))  # 联系方式（手机号）
     is_matched = db.Column(db.Boolean, default=False)
     select_loc = db.Column(db.String(100))  # AI分析出的标准地点名称
+
+    # 热点查询的复合索引：按学号查卡、未匹配卡片列表（均限定status和最近半个月）
+    __table_args__ = (
+        db.Index('ix_campus_card_student_status_found_time', 'student_id', 'status', 'found_time'),
+        db.Index('ix_campus_card_matched_status_found_time', 'is_matched', 'status', 'found_time'),
+    )
     
 class ForumPost(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -31,9 +38,64 @@ class ForumPost(db.Model):
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     is_ad = db.Column(db.Boolean, default=False)  # 是否为广告
     is_advice = db.Column(db.Boolean, default=False)  # 是否为建议帖
+
+    # 论坛信息流按(created_at, id)倒序做游标分页
+    __table_args__ = (db.Index('ix_forum_post_created_at_id', 'created_at', 'id'),)
     
 class Reward(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
     description = db.Column(db.String(200))
-    points_required = db.Column(db.Integer)
\ No newline at end of file
+    points_required = db.Column(db.Integer)
+
+# 地点识别结果的持久化缓存（按规范化输入 + 地点数据库哈希区分）
+class LocationCacheEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(32), nullable=False)  # 规范化输入的哈希
+    map_hash = db.Column(db.String(32), nullable=False)  # location_database.json的哈希
+    user_input = db.Column(db.String(200))
+    result = db.Column(db.Text, nullable=False)  # JSON格式的识别结果
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    __table_args__ = (db.UniqueConstraint('cache_key', 'map_hash'),)
+
+# 预生成的AI建议（每个建筑物与其最近招领点一条，地图修改后按新哈希重新生成）
+class PrecomputedAdvice(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    location_name = db.Column(db.String(100), nullable=False)  # 建筑物名称
+    lost_and_found = db.Column(db.String(100), nullable=False)  # 最近招领点名称
+    map_hash = db.Column(db.String(32), nullable=False)  # location_database.json的哈希
+    advice = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    __table_args__ = (db.UniqueConstraint('location_name', 'lost_and_found', 'map_hash'),)
+
+# 后台地点分析任务（持久化，服务重启后可继续执行）
+class LocationAnalysisJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    card_id = db.Column(db.Integer, nullable=False)
+    found_location = db.Column(db.String(100))
+    status = db.Column(db.String(20), default='pending')  # pending/running/done/failed
+    attempts = db.Column(db.Integer, default=0)  # 已执行次数
+    last_error = db.Column(db.String(500))  # 最近一次失败原因
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+
+# 热门地点物化计数（按发现日期和地点汇总的校园卡数量）
+class HotLocationCounter(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # found_time所在日期
+    location = db.Column(db.String(120), nullable=False)  # 标准地点名称或"[原始] xxx"，空字符串表示无地点
+    is_ai = db.Column(db.Boolean, nullable=False, default=False)  # 是否为AI分析后的标准地点
+    count = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.UniqueConstraint('day', 'location', 'is_ai'),)
+
+# 积分流水（只追加不修改，每次积分变动一条记录）
+class PointsLedger(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    delta = db.Column(db.Integer, nullable=False)  # 积分变动，正数为增加，负数为扣除
+    balance_after = db.Column(db.Integer, nullable=False)  # 变动后的积分余额
+    reason = db.Column(db.String(30), nullable=False)  # opening_balance/report_card/redeem
+    reference_id = db.Column(db.Integer)  # 关联的校园卡ID或奖励ID
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
\ No newline at end of file
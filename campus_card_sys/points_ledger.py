@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+积分账户模块
+积分变动通过一条带条件的UPDATE语句完成（扣除时要求余额充足），
+不在Python中读-改-写，并发请求不会丢失更新或透支；
+每次变动同时追加一条points_ledger流水记录
+"""
+
+from models import db, User, PointsLedger
+
+# 流水类型
+REASON_OPENING_BALANCE = 'opening_balance'  # 启用流水前已有的积分
+REASON_REPORT_CARD = 'report_card'          # 报告捡到校园卡的奖励
+REASON_REDEEM = 'redeem'                    # 兑换奖励
+
+
+def change_points(user_id, delta, reason, reference_id=None):
+    """
+    在当前事务中原子地修改用户积分并写入流水（不提交，需在write_transaction中调用）
+
+    Args:
+        user_id (int): 用户ID
+        delta (int): 积分变动，负数表示扣除，扣除时要求余额不小于扣除数
+        reason (str): 流水类型
+        reference_id (int): 关联的校园卡ID或奖励ID
+
+    Returns:
+        int: 变动后的余额；用户不存在或余额不足时返回None
+    """
+    stmt = db.update(User).where(User.id == user_id).values(
+        points=db.func.coalesce(User.points, 0) + delta
+    )
+    if delta < 0:
+        stmt = stmt.where(User.points >= -delta)
+    stmt = stmt.execution_options(synchronize_session=False)
+
+    if db.engine.dialect.update_returning:
+        balance = db.session.execute(stmt.returning(User.points)).scalar()
+        if balance is None:
+            return None
+    else:
+        if db.session.execute(stmt).rowcount == 0:
+            return None
+        # 本事务已持有该行的写锁，读到的就是刚更新后的余额
+        balance = db.session.execute(
+            db.select(User.points).where(User.id == user_id)
+        ).scalar()
+
+    db.session.add(PointsLedger(
+        user_id=user_id,
+        delta=delta,
+        balance_after=balance,
+        reason=reason,
+        reference_id=reference_id
+    ))
+    return balance
+
+
+def record_opening_balances():
+    """
+    为还没有任何流水的用户补记一条期初余额，使流水之和与当前积分一致
+    （不提交，需在write_transaction中调用）
+
+    Returns:
+        int: 补记的用户数
+    """
+    has_ledger = db.select(PointsLedger.id).where(PointsLedger.user_id == User.id).exists()
+    users = db.session.execute(
+        db.select(User.id, User.points).where(~has_ledger)
+    ).all()
+
+    for user_id, points in users:
+        db.session.add(PointsLedger(
+            user_id=user_id,
+            delta=points or 0,
+            balance_after=points or 0,
+            reason=REASON_OPENING_BALANCE
+        ))
+    return len(users)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+奖励目录缓存模块
+序列化后的奖励列表保存在内存中，Reward表有增删改并提交后版本号加一、缓存失效；
+其他进程（init_data.py、手工修改数据库）的变更无法通过事件得知，缓存超过revalidate_after秒后
+重新读取Reward表核对内容，最多延迟这么久生效；
+ETag由内容哈希生成，客户端可用If-None-Match做条件请求
+"""
+
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from models import Reward
+
+
+class RewardCatalog:
+    """奖励目录的内存缓存（按需重建）"""
+
+    def __init__(self, revalidate_after=10.0):
+        self.revalidate_after = revalidate_after  # 缓存内容重新核对的间隔（秒）
+
+        self._lock = threading.Lock()
+        self._version = 0          # Reward表每次变更加一
+        self._built_version = -1   # 当前缓存对应的版本
+        self._validated_at = 0.0   # 最近一次读取Reward表的时间（time.monotonic）
+        self._body = None          # 序列化后的JSON
+        self._etag = None
+        self._last_modified = None
+
+        self._hits = 0
+        self._rebuilds = 0
+        self._revalidations = 0
+        self._external_changes = 0  # 重新核对时发现的其他进程的变更
+
+    def invalidate(self):
+        """奖励数据已变更"""
+        with self._lock:
+            self._version += 1
+
+    def get(self):
+        """
+        获取奖励目录
+
+        Returns:
+            tuple: (JSON字符串, ETag, 最后修改时间)
+        """
+        with self._lock:
+            current = self._built_version == self._version
+            if current and time.monotonic() - self._validated_at < self.revalidate_after:
+                self._hits += 1
+                return self._body, self._etag, self._last_modified
+            version = self._version
+
+        read_at = time.monotonic()
+        rewards = Reward.query.order_by(Reward.id).all()
+        result = []
+        for reward in rewards:
+            result.append({
+                'id': reward.id,
+                'name': reward.name,
+                'description': reward.description,
+                'points_required': reward.points_required
+            })
+        body = json.dumps(result, ensure_ascii=False)
+        etag = hashlib.md5(body.encode('utf-8')).hexdigest()
+
+        with self._lock:
+            if current:
+                self._revalidations += 1
+                if etag != self._etag:
+                    self._external_changes += 1
+            else:
+                self._rebuilds += 1
+            if etag != self._etag:
+                # 内容确实变化时才更新最后修改时间（HTTP日期精确到秒）
+                self._last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+            self._body = body
+            self._etag = etag
+            # 重建期间又有变更时不标记为最新，下次请求重新读取
+            if self._version == version:
+                self._built_version = version
+                self._validated_at = read_at
+            return self._body, self._etag, self._last_modified
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            return {
+                'version': self._version,
+                'cached': self._built_version == self._version,
+                'etag': self._etag,
+                'hits': self._hits,
+                'rebuilds': self._rebuilds,
+                'revalidations': self._revalidations,
+                'external_changes': self._external_changes
+            }
+
+
+REWARD_CATALOG = RewardCatalog()
+
+
+def _mark_rewards_changed(mapper, connection, target):
+    REWARD_CATALOG.invalidate()
+    # 提交后再失效一次，避免提交前重建的缓存读到旧数据
+    session = object_session(target)
+    if session is not None:
+        session.info['rewards_changed'] = True
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Reward, _event_name, _mark_rewards_changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('rewards_changed', False):
+        REWARD_CATALOG.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('rewards_changed', None)
@@ -68,12 +68,14 @@ def main():
         print("=" * 60)
         
         # 直接导入并启动
-        from app import app
+        from app import app, initialize_services
         from waitress import serve
         
         with app.app_context():
-            from models import db
-            db.create_all()
+            # 创建缺少的表并为已有数据库补齐新增的字段和索引
+            from schema_migration import upgrade_schema
+            upgrade_schema()
+        initialize_services()
         
         serve(
             app,
@@ -82,7 +84,9 @@ def main():
             threads=10,
             connection_limit=1000,
             cleanup_interval=30,
-            channel_timeout=120
+            channel_timeout=120,
+            # 预读请求，使流式响应能够检测到客户端断开（waitress.client_disconnected）
+            channel_request_lookahead=1
         )
     else:
         print("使用 Flask 开发服务器（不推荐长时间运行）")
@@ -91,10 +95,12 @@ def main():
         print("\n按 Ctrl+C 停止服务")
         print("=" * 60)
         
-        from app import app
+        from app import app, initialize_services
         with app.app_context():
-            from models import db
-            db.create_all()
+            # 创建缺少的表并为已有数据库补齐新增的字段和索引
+            from schema_migration import upgrade_schema
+            upgrade_schema()
+        initialize_services()
         
         app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
 
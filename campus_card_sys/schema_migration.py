@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表结构升级模块
+db.create_all()只创建不存在的表，不会修改已有的表；
+模型中新增的表、字段和索引由这里补齐，服务启动时和migrate_db.py都调用它，
+已有数据库（如instance/campus_card.db）升级后直接可用
+
+所有函数都需要在应用上下文中调用
+"""
+
+from models import db
+
+
+def migrate_schema():
+    """
+    创建缺少的表，并为已有表补充模型中新增的字段（如contact、select_loc、thumbnail_url）
+
+    通过SQLAlchemy的inspector读取表结构，ALTER TABLE语句按当前数据库方言生成，
+    SQLite和PostgreSQL等服务器数据库使用同一套迁移代码
+
+    Returns:
+        list: 新增的表和字段（"表名"或"表名.字段名"）
+    """
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+
+    # 新增的表直接创建（create_all会跳过已存在的表）
+    missing_tables = [table.name for table in db.metadata.sorted_tables
+                      if table.name not in existing_tables]
+    if missing_tables:
+        db.create_all()
+        print(f"✓ 新建数据表: {', '.join(missing_tables)}")
+    changes = list(missing_tables)
+
+    preparer = db.engine.dialect.identifier_preparer
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            # 检查字段是否已存在
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    print(f"✗ {table.name}.{column.name}为非空字段且没有默认值，需要手动迁移")
+                    continue
+
+                print(f"正在添加{table.name}.{column.name}字段...")
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column_type}"
+                )
+                changes.append(f"{table.name}.{column.name}")
+                print(f"✓ {table.name}.{column.name}字段添加成功")
+    return changes
+
+
+def create_missing_indexes(verbose=True):
+    """为已有数据库补建模型中声明的索引"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+            if verbose:
+                print(f"✓ 索引{index.name}已就绪")
+
+
+def backfill_new_tables(new_tables):
+    """新建的派生表根据已有数据补齐内容（热门地点计数、积分流水期初余额）"""
+    if 'hot_location_counter' in new_tables:
+        from hot_location_counter import rebuild_counters
+        print(f"✓ 热门地点计数重建完成: {rebuild_counters()}个计数桶")
+    if 'points_ledger' in new_tables:
+        from db_config import write_transaction
+        from points_ledger import record_opening_balances
+        with write_transaction():
+            count = record_opening_balances()
+        print(f"✓ 积分流水期初余额补记完成: {count}个用户")
+
+
+def upgrade_schema():
+    """服务启动时调用：补齐表、字段和索引（已是最新结构时只做检查）"""
+    had_tables = bool(db.inspect(db.engine).get_table_names())
+    changes = migrate_schema()
+    create_missing_indexes(verbose=False)
+    if changes:
+        print(f"✓ 数据库结构已升级: {', '.join(changes)}")
+        if had_tables:
+            backfill_new_tables(changes)
+    return changes
@@ -1032,8 +1032,19 @@ async function loadPublicList() {
                     `;
                 }
 
+                // 列表中只加载缩略图，点击查看展示图
+                let photoHtml = '';
+                if (card.thumbnail_url) {
+                    photoHtml = `
+                        <a href="${API_BASE}${card.photo_url || card.thumbnail_url}" target="_blank">
+                            <img class="card-thumbnail" src="${API_BASE}${card.thumbnail_url}" alt="校园卡照片" loading="lazy">
+                        </a>
+                    `;
+                }
+
                 contentDiv.innerHTML += `
                     <div class="result-item">
+                        ${photoHtml}
                         <p><strong>发现时间：</strong>${card.found_time}</p>
                         <p><strong>发现地点：</strong>${card.found_location}</p>
                         <p>${ownerInfo}</p>
@@ -1067,39 +1078,73 @@ async function loadPublicList() {
     }
 }
 
-// 加载论坛帖子
-async function loadForumPosts() {
+// 论坛分页状态
+const FORUM_PAGE_SIZE = 20;
+let forumNextCursor = null;
+
+// 渲染单个帖子
+function renderForumPost(post) {
+    let postClass = '';
+    let postLabel = '';
+
+    if (post.is_ad) {
+        postClass = 'ad';
+        postLabel = '[广告]';
+    } else if (post.is_advice) {
+        postClass = 'advice';
+        postLabel = '[建议/反馈]';
+    }
+
+    return `
+        <div class="post-item ${postClass}">
+            <div class="post-title">${post.title} ${postLabel}</div>
+            <div class="post-meta">作者：${post.author_name} | 发布时间：${post.created_at}</div>
+            <div class="post-content">${post.content}</div>
+        </div>
+    `;
+}
+
+// 加载论坛帖子（append为true时加载下一页并追加到列表末尾）
+async function loadForumPosts(append = false) {
+    const postsDiv = document.getElementById('forum-posts');
+
+    let url = `/forum/posts?limit=${FORUM_PAGE_SIZE}`;
+    if (append && forumNextCursor) {
+        url += `&after=${forumNextCursor}`;
+    }
+
     try {
-        const posts = await apiCall('/forum/posts');
-        const postsDiv = document.getElementById('forum-posts');
+        const data = await apiCall(url);
+        const posts = data.posts;
 
-        if (posts.length > 0) {
+        if (!append) {
             postsDiv.innerHTML = '';
-            posts.forEach(post => {
-                let postClass = '';
-                let postLabel = '';
-
-                if (post.is_ad) {
-                    postClass = 'ad';
-                    postLabel = '[广告]';
-                } else if (post.is_advice) {
-                    postClass = 'advice';
-                    postLabel = '[建议/反馈]';
-                }
-
-                postsDiv.innerHTML += `
-                    <div class="post-item ${postClass}">
-                        <div class="post-title">${post.title} ${postLabel}</div>
-                        <div class="post-meta">作者：${post.author_name} | 发布时间：${post.created_at}</div>
-                        <div class="post-content">${post.content}</div>
-                    </div>
-                `;
-            });
         } else {
+            const moreBtn = document.getElementById('forum-load-more');
+            if (moreBtn) {
+                moreBtn.remove();
+            }
+        }
+
+        if (!append && posts.length === 0) {
             postsDiv.innerHTML = '<p>暂无帖子</p>';
+            forumNextCursor = null;
+            return;
+        }
+
+        postsDiv.insertAdjacentHTML('beforeend', posts.map(renderForumPost).join(''));
+
+        forumNextCursor = data.next_cursor;
+        if (forumNextCursor) {
+            postsDiv.insertAdjacentHTML('beforeend',
+                '<button id="forum-load-more" class="load-more-btn" onclick="loadForumPosts(true)">加载更多</button>');
         }
     } catch (error) {
-        document.getElementById('forum-posts').innerHTML = '<p>加载失败</p>';
+        if (append) {
+            alert('加载失败');
+        } else {
+            postsDiv.innerHTML = '<p>加载失败</p>';
+        }
     }
 }
 
@@ -1149,10 +1194,39 @@ document.getElementById('create-post-form').addEventListener('submit', async (e)
     }
 });
 
+// 奖励目录本地缓存（配合ETag做条件请求）
+let rewardCatalogCache = { etag: null, rewards: null };
+
+// 获取奖励目录：目录未变化时服务器返回304，直接使用本地缓存
+async function fetchRewards() {
+    const headers = {};
+    if (rewardCatalogCache.etag && rewardCatalogCache.rewards) {
+        headers['If-None-Match'] = rewardCatalogCache.etag;
+    }
+
+    const response = await fetch(`${API_BASE}/rewards`, { headers });
+
+    if (response.status === 304) {
+        connectionStatus = 'connected';
+        updateConnectionStatus();
+        return rewardCatalogCache.rewards;
+    }
+
+    const rewards = await response.json();
+    if (!response.ok) {
+        throw new Error(rewards.error || 'API调用失败');
+    }
+
+    connectionStatus = 'connected';
+    updateConnectionStatus();
+    rewardCatalogCache = { etag: response.headers.get('ETag'), rewards };
+    return rewards;
+}
+
 // 加载奖励列表
 async function loadRewards() {
     try {
-        const rewards = await apiCall('/rewards');
+        const rewards = await fetchRewards();
         const rewardsDiv = document.getElementById('rewards-list');
         
         if (rewards.length > 0) {
@@ -1505,17 +1579,29 @@ async function loadAIAdviceForResults(results) {
                     // 显示加载动画
                     adviceElement.innerHTML = '<div class="ai-loading">🤖 正在生成智能建议<span class="loading-dots">...</span></div>';
 
-                    // 调用AI建议接口
-                    const adviceResult = await apiCall('/get_ai_advice', 'POST', {
+                    const payload = {
                         location_name: locationResult.location,
                         nearest_point: locationResult.nearest_lost_and_found
-                    });
+                    };
+
+                    // 优先使用流式接口，边生成边显示
+                    let streamed = false;
+                    try {
+                        streamed = await streamAIAdvice(adviceElement, payload);
+                    } catch (streamError) {
+                        console.warn('AI建议流式加载失败，改用普通接口:', streamError);
+                    }
 
-                    if (adviceResult.success) {
-                        // 流式显示AI建议
-                        await typewriterEffect(adviceElement, adviceResult.ai_advice);
-                    } else {
-                        adviceElement.innerHTML = `<div class="ai-error">❌ AI建议生成失败，请稍后重试</div>`;
+                    if (!streamed) {
+                        // 调用AI建议接口
+                        const adviceResult = await apiCall('/get_ai_advice', 'POST', payload);
+
+                        if (adviceResult.success) {
+                            // 流式显示AI建议
+                            await typewriterEffect(adviceElement, adviceResult.ai_advice);
+                        } else {
+                            adviceElement.innerHTML = `<div class="ai-error">❌ AI建议生成失败，请稍后重试</div>`;
+                        }
                     }
                 }
             } catch (error) {
@@ -1529,6 +1615,73 @@ async function loadAIAdviceForResults(results) {
     }
 }
 
+// 通过Server-Sent Events流式加载AI建议，每收到一个片段就追加显示
+// 返回是否已显示内容；在收到任何片段前失败时返回false，由调用方改用普通接口
+async function streamAIAdvice(element, payload) {
+    const response = await fetch(`${API_BASE}/get_ai_advice/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
+        },
+        body: JSON.stringify(payload)
+    });
+
+    if (!response.ok || !response.body) {
+        return false;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+    let adviceText = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+
+        // 事件之间以空行分隔，最后一段可能不完整，留到下次处理
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const rawEvent of events) {
+            let eventName = 'message';
+            let eventData = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    eventData += line.slice(5).trim();
+                }
+            }
+            if (!eventData) {
+                continue;
+            }
+
+            const data = JSON.parse(eventData);
+            if (eventName === 'delta') {
+                adviceText += data.delta;
+                element.textContent = adviceText;
+            } else if (eventName === 'done') {
+                element.textContent = data.ai_advice;
+                if (data.truncated) {
+                    // 回复在中途停止，提示用户内容不完整
+                    const notice = document.createElement('div');
+                    notice.className = 'ai-error';
+                    notice.textContent = '⚠️ AI建议未能完整生成，以上仅为部分内容';
+                    element.appendChild(notice);
+                }
+                return true;
+            }
+        }
+    }
+
+    return adviceText.length > 0;
+}
+
 // 打字机效果显示AI建议
 async function typewriterEffect(element, text) {
     element.innerHTML = '';
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+测试公共配置
+app模块在导入时读取DATABASE_URL并加载location_database.json等相对路径文件，
+因此在导入前指定临时数据库，并切换到campus_card_sys目录
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DB_DIR = tempfile.mkdtemp(prefix='campus_card_test_')
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(TEST_DB_DIR, 'campus_card.db')}")
+os.chdir(APP_DIR)
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    """导入app并建表；后台地点分析使用桩函数，不调用DeepSeek"""
+    import app as app_module
+    from models import db
+
+    with app_module.app.app_context():
+        db.create_all()
+    app_module.LOCATION_ANALYSIS_QUEUE.handler = lambda items: [None] * len(items)
+    return app_module
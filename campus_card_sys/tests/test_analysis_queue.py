@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""地点分析任务队列：失败重试前的退避"""
+
+import time
+
+from models import db, LocationAnalysisJob
+from db_config import write_transaction
+from analysis_queue import AnalysisJobQueue
+
+
+def test_failed_job_retries_after_backoff(app_module):
+    app = app_module.app
+    calls = []
+
+    def flaky_handler(items):
+        calls.append(time.monotonic())
+        return [RuntimeError('上游不可用') if len(calls) == 1 else None for _ in items]
+
+    job_queue = AnalysisJobQueue(app, flaky_handler, max_workers=1, batch_wait=0,
+                                 retry_backoff=0.5, retry_backoff_max=0.5)
+    assert job_queue.retry_delay(1) == 0.5
+    assert job_queue.retry_delay(3) == 0.5
+
+    with app.app_context():
+        with write_transaction():
+            job = job_queue.create_job(0, '图书馆')
+        job_id = job.id
+    job_queue.submit(job_id)
+
+    deadline = time.monotonic() + 10
+    while len(calls) < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    # 第一次失败后任务在退避期间不在队列中
+    assert job_queue.get_stats()['delayed_retries'] == 1
+    assert len(calls) == 1
+
+    while len(calls) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.5
+
+    while time.monotonic() < deadline:
+        with app.app_context():
+            job = db.session.get(LocationAnalysisJob, job_id)
+            if job.status == 'done':
+                break
+        time.sleep(0.01)
+    assert job.status == 'done'
+    assert job.attempts == 2
+    assert job_queue.get_stats()['delayed_retries'] == 0
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""并发写入：写锁与连接池不能相互等待"""
+
+import threading
+
+from models import db, User, CampusCard, LocationAnalysisJob, PointsLedger
+
+CONCURRENT_REQUESTS = 24  # 超过连接池大小（pool_size + max_overflow）
+REQUEST_TIMEOUT = 60
+
+
+def test_concurrent_report_card(app_module):
+    app = app_module.app
+    with app.app_context():
+        reporter = User(student_id='2099000', full_name='并发测试', password='x', points=0)
+        db.session.add(reporter)
+        db.session.commit()
+        reporter_id = reporter.id
+
+    statuses = []
+    statuses_lock = threading.Lock()
+    barrier = threading.Barrier(CONCURRENT_REQUESTS)
+
+    def report(index):
+        client = app.test_client()
+        barrier.wait()
+        response = client.post('/report_card', data={
+            'card_number': f'2099{index:03d}',
+            'handler_option': '1',
+            'contact': '13800000000',
+            'found_location': '图书馆门口',
+            'current_user_id': str(reporter_id),
+            'current_user_name': '并发测试'
+        })
+        with statuses_lock:
+            statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=report, args=(i,), daemon=True) for i in range(CONCURRENT_REQUESTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(REQUEST_TIMEOUT)
+
+    assert not any(thread.is_alive() for thread in threads), '并发写入未在限定时间内完成（写锁与连接池死锁）'
+    assert statuses == [200] * CONCURRENT_REQUESTS
+
+    with app.app_context():
+        card_numbers = [f'2099{i:03d}' for i in range(CONCURRENT_REQUESTS)]
+        assert CampusCard.query.filter(CampusCard.card_number.in_(card_numbers)).count() == CONCURRENT_REQUESTS
+        card_ids = [card.id for card in CampusCard.query.filter(CampusCard.card_number.in_(card_numbers))]
+        assert LocationAnalysisJob.query.filter(LocationAnalysisJob.card_id.in_(card_ids)).count() == CONCURRENT_REQUESTS
+
+        reporter = db.session.get(User, reporter_id)
+        ledger_total = db.session.query(db.func.sum(PointsLedger.delta)).filter_by(user_id=reporter_id).scalar()
+        assert reporter.points == ledger_total == app_module.REPORT_CARD_REWARD_POINTS * CONCURRENT_REQUESTS
+
+
+def test_concurrent_writes_reuse_request_session(app_module):
+    """写锁内调用的公共函数复用当前会话，不再从连接池取第二个连接"""
+    from db_config import write_transaction, WRITE_SERIALIZER
+
+    app = app_module.app
+    with app.app_context():
+        pool = db.engine.pool
+        # 每个线程先各占用一个连接，正好占满连接池
+        writers = pool.size() + max(pool._max_overflow, 0)
+    errors = []
+    barrier = threading.Barrier(writers)
+
+    def write(index):
+        try:
+            with app.test_request_context():
+                User.query.count()
+                barrier.wait(REQUEST_TIMEOUT)
+                with write_transaction():
+                    app_module.save_to_persistent_cache(f'concurrent-{index}', f'地点{index}', {'best_match': None})
+        except Exception as e:
+            errors.append(e)
+
+    released_before = WRITE_SERIALIZER.get_stats()['released_connections']
+    threads = [threading.Thread(target=write, args=(i,), daemon=True) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(REQUEST_TIMEOUT)
+
+    assert not any(thread.is_alive() for thread in threads), '并发写入未在限定时间内完成（写锁与连接池死锁）'
+    assert errors == []
+    assert WRITE_SERIALIZER.get_stats()['released_connections'] - released_before >= writers
+
+    for index in range(writers):
+        assert app_module.get_from_persistent_cache(f'concurrent-{index}') == {'best_match': None}
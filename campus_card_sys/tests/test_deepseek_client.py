@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""DeepSeek客户端的连接复用统计（直连和通过HTTP代理）"""
+
+import json
+import time
+import socket
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from deepseek_client import DeepSeekClient, CircuitBreaker
+
+KEEPALIVE_OPTION = (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+
+class FakeDeepSeekHandler(BaseHTTPRequestHandler):
+    """同时充当API服务器和HTTP代理（代理请求的路径是完整URL），保持长连接"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({
+            'choices': [{'message': {'content': 'ok'}}],
+            'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeDeepSeekHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('use_proxy', [False, True], ids=['direct', 'proxy'])
+def test_connection_stats(fake_server, monkeypatch, use_proxy):
+    for name in ('HTTP_PROXY', 'http_proxy', 'HTTPS_PROXY', 'https_proxy', 'NO_PROXY', 'no_proxy'):
+        monkeypatch.delenv(name, raising=False)
+    if use_proxy:
+        monkeypatch.setenv('HTTP_PROXY', fake_server)
+        api_url = 'http://deepseek.test/v1/chat/completions'
+    else:
+        api_url = f'{fake_server}/v1/chat/completions'
+
+    client = DeepSeekClient('test-key', api_url)
+    try:
+        for _ in range(5):
+            client.chat({'model': 'deepseek-chat', 'messages': []}, max_retries=1)
+
+        stats = client.get_stats()
+        assert stats['requests'] == 5
+        assert stats['new_connections'] == 1
+        assert stats['reused_connections'] == 4
+
+        adapter = client.session.get_adapter(api_url)
+        manager = adapter.proxy_manager[fake_server] if use_proxy else adapter.poolmanager
+        assert KEEPALIVE_OPTION in manager.connection_pool_kw['socket_options']
+    finally:
+        client.close()
+
+
+def test_no_proxy_bypasses_proxy(fake_server, monkeypatch):
+    """NO_PROXY中的主机直连，不经过HTTP_PROXY"""
+    for name in ('http_proxy', 'HTTPS_PROXY', 'https_proxy', 'no_proxy'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('HTTP_PROXY', 'http://127.0.0.1:9')  # 不可用的代理
+    monkeypatch.setenv('NO_PROXY', '127.0.0.1')
+
+    client = DeepSeekClient('test-key', f'{fake_server}/v1/chat/completions')
+    try:
+        assert client.chat({'model': 'deepseek-chat', 'messages': []}, max_retries=1) is not None
+        adapter = client.session.get_adapter(fake_server)
+        assert not adapter.proxy_manager
+    finally:
+        client.close()
+
+
+def _error_server(status_code):
+    class ErrorHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            body = b'{"error": {"message": "test"}}'
+            self.send_response(status_code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ErrorHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.mark.parametrize('status_code, trips', [(400, False), (401, False), (422, False), (500, True), (503, True)])
+def test_only_upstream_failures_trip_breaker(monkeypatch, status_code, trips):
+    for name in ('HTTP_PROXY', 'http_proxy'):
+        monkeypatch.delenv(name, raising=False)
+    server = _error_server(status_code)
+    client = DeepSeekClient(
+        'test-key', f'http://127.0.0.1:{server.server_address[1]}/v1/chat/completions',
+        backoff_factor=0, circuit_breaker=CircuitBreaker(failure_threshold=2)
+    )
+    try:
+        for _ in range(2):
+            assert client.chat({'model': 'deepseek-chat', 'messages': []}, max_retries=1) is None
+
+        assert (client.circuit_breaker.get_state()['state'] == CircuitBreaker.OPEN) is trips
+        assert client.get_stats()['client_errors'] == (0 if trips else 2)
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+def _streaming_server(chunks, interval, stall=0, finish=True):
+    """每隔interval秒发送一个SSE片段；stall秒后才发送第一个片段"""
+    class StreamHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+
+            def send(data):
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            try:
+                time.sleep(stall)
+                for chunk in chunks:
+                    event = {'choices': [{'delta': {'content': chunk}, 'finish_reason': None}]}
+                    send(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                    time.sleep(interval)
+                if finish:
+                    send(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StreamHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.mark.parametrize('server_args, stream_args, expected', [
+    # 正常结束
+    ((['校', '园', '卡'], 0.01), {}, (True, None, '校园卡', CircuitBreaker.CLOSED)),
+    # 上游一直在输出，但超过总时长上限：不完整，不计入熔断
+    ((['a'] * 20, 0.1), {'max_duration': 0.5}, (False, 'max_duration', None, CircuitBreaker.CLOSED)),
+    # 上游超过空闲超时没有输出：计入熔断
+    ((['a'], 0.01, 1.5), {'idle_timeout': 0.3}, (False, 'idle_timeout', '', CircuitBreaker.OPEN)),
+], ids=['complete', 'max_duration', 'idle_timeout'])
+def test_stream_chat_outcomes(monkeypatch, server_args, stream_args, expected):
+    for name in ('HTTP_PROXY', 'http_proxy'):
+        monkeypatch.delenv(name, raising=False)
+    completed, stop_reason, text, breaker_state = expected
+    server = _streaming_server(*server_args)
+    client = DeepSeekClient(
+        'test-key', f'http://127.0.0.1:{server.server_address[1]}/v1/chat/completions',
+        circuit_breaker=CircuitBreaker(failure_threshold=1)
+    )
+    try:
+        stream = client.stream_chat({'model': 'deepseek-chat', 'messages': []}, **stream_args)
+        received = ''.join(stream)
+        stream.close()
+
+        assert stream.completed is completed
+        assert stream.stop_reason == stop_reason
+        if text is not None:
+            assert received == text
+        else:
+            assert 0 < len(received) < 20
+        assert client.circuit_breaker.get_state()['state'] == breaker_state
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
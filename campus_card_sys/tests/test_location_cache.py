@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""带时间预算的后台执行"""
+
+import threading
+
+from location_cache import HedgedExecutor
+
+
+def test_hedged_executor_skips_when_saturated():
+    executor = HedgedExecutor(max_workers=2, thread_name_prefix='test-hedged')
+    release = threading.Event()
+
+    def slow():
+        release.wait(10)
+        return 'slow'
+
+    assert executor.run(slow, 0.01) == (False, None)
+    assert executor.run(slow, 0.01) == (False, None)
+    # 工作线程全部被超时的计算占用：不提交、不排队，立即返回
+    assert executor.run(slow, 10) == (None, None)
+
+    stats = executor.get_stats()
+    assert stats['in_flight'] == 2
+    assert stats['budget_exceeded'] == 2
+    assert stats['skipped'] == 1
+
+    release.set()
+    executor._executor.shutdown(wait=True)
+    assert executor.get_stats()['in_flight'] == 0
+    assert executor.get_stats()['background_completed'] == 2
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""地点识别提示词的候选地点裁剪"""
+
+import pytest
+
+
+@pytest.mark.parametrize('user_input, expected', [
+    ('图书管三楼', '图书馆'),
+    ('在梧桐院二楼捡到的', '梧桐苑'),
+    ('食堂门口', '梧桐苑'),
+    ('一食堂', '康桥苑'),
+    ('操场边上', '西足球场'),
+    ('教学楼A座', '主A'),
+    ('宿舍楼下', '西1舍'),
+    ('体育馆旁边', '体育中心'),
+])
+def test_typo_and_partial_inputs_are_pruned(app_module, user_input, expected):
+    """本地没有直接匹配、需要调用AI的输入：只发送裁剪后的候选地点，且包含正确地点"""
+    assert not app_module.LOCATION_MATCHER.match(user_input)
+
+    location_names, pruned = app_module.select_prompt_candidates([user_input])
+
+    assert pruned
+    assert len(location_names) <= app_module.PROMPT_CANDIDATE_CONFIG['top_k']
+    assert expected in location_names
+
+
+def test_unrelated_input_sends_all_locations(app_module):
+    location_names, pruned = app_module.select_prompt_candidates(['不知道在哪'])
+
+    assert not pruned
+    assert location_names == app_module.ALL_LOCATION_NAMES
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""热点查询的执行计划：建表并补建索引后都应走索引"""
+
+from models import db, CampusCard
+
+
+def test_check_query_plans(app_module):
+    import migrate_db
+
+    migrate_db.migrate_database()
+    migrate_db.create_missing_indexes()
+    assert migrate_db.check_query_plans()
+
+
+def test_check_query_plans_detects_missing_index(app_module):
+    import migrate_db
+
+    index = next(index for index in CampusCard.__table__.indexes
+                 if index.name == 'ix_campus_card_student_status_found_time')
+    with app_module.app.app_context():
+        index.drop(bind=db.engine)
+    try:
+        assert not migrate_db.check_query_plans()
+    finally:
+        migrate_db.create_missing_indexes()
+    assert migrate_db.check_query_plans()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""启动时的表结构升级：仓库中旧版本的instance/campus_card.db升级后可以正常查询"""
+
+import os
+import shutil
+
+from flask import Flask
+
+from models import db, CampusCard, HotLocationCounter
+from db_config import get_engine_options
+from schema_migration import upgrade_schema
+
+SHIPPED_DATABASE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'instance', 'campus_card.db')
+
+
+def test_upgrade_shipped_database(tmp_path):
+    database = tmp_path / 'campus_card.db'
+    shutil.copy(SHIPPED_DATABASE, database)
+    url = f'sqlite:///{database}'
+
+    upgrade_app = Flask(__name__)
+    upgrade_app.config['SQLALCHEMY_DATABASE_URI'] = url
+    upgrade_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    upgrade_app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options(url)
+    db.init_app(upgrade_app)
+
+    with upgrade_app.app_context():
+        try:
+            changes = upgrade_schema()
+            assert 'campus_card.thumbnail_url' in changes
+
+            # 新增字段后查询CampusCard不再报no such column
+            card_count = CampusCard.query.count()
+            assert CampusCard.query.filter(CampusCard.thumbnail_url.is_(None)).count() == card_count
+            # 新建的热门地点计数表已根据已有校园卡补齐
+            if card_count:
+                assert HotLocationCounter.query.count() > 0
+
+            # 已是最新结构时不再改动
+            assert upgrade_schema() == []
+        finally:
+            db.engine.dispose()
@@ -1,8 +1,14 @@
 
-from app import app
+from app import app, initialize_services
+from schema_migration import upgrade_schema
 from waitress import serve
 
 if __name__ == '__main__':
+    with app.app_context():
+        # 创建缺少的表并为已有数据库补齐新增的字段和索引
+        upgrade_schema()
+    initialize_services()
+
     print("正在启动 Waitress 服务器...")
     print("服务地址: http://localhost:5000")
     print("按 Ctrl+C 停止服务")
@@ -14,5 +20,7 @@ if __name__ == '__main__':
         threads=10,
         connection_limit=1000,
         cleanup_interval=30,
-        channel_timeout=120
+        channel_timeout=120,
+        # 预读请求，使流式响应能够检测到客户端断开（waitress.client_disconnected）
+        channel_request_lookahead=1
     )